@@ -0,0 +1,441 @@
+"""Aggregation mode: stacks the numeric sections of many fastqc files into sample x position arrays."""
+# David Oluwasusi 6th November 2024
+
+import contextlib
+import csv
+import io
+import os
+import re
+import sys
+import warnings
+import numpy as np
+import constants as sections
+from batch import assign_output_folders, collect_inputs
+from models import FastQCParser
+
+# Sections with one row per position or bin, keyed by their first column
+AGGREGATED_SECTIONS = (
+    sections.PER_BASE_SEQ,
+    sections.PER_SEQ_QUALITY_SCORES,
+    sections.PER_BASE_SEQ_CONTENT,
+    sections.PER_SEQ_GC_CONTENT,
+    sections.PER_BASE_N_CONTENT,
+    sections.SEQ_LEN_DIST,
+    sections.SEQ_DUPLICATION_LEVEL,
+    sections.ADAPTER_CONTENT,
+)
+PERCENTILES = (5, 25, 75, 95)
+NPZ_FILE = "aggregate.npz"
+PARQUET_FOLDER = "aggregate"
+SUMMARY_FILE = "aggregate_summary.tsv"
+TRIMMING_FILE = "adapter_trimming.tsv"
+# FastQC warns above 5% and fails above 10% adapter content
+DEFAULT_ADAPTER_THRESHOLDS = (5.0, 10.0)
+# Position labels such as '12' or grouped bases such as '10-14'
+POSITION_LABEL = re.compile(r"^\d+(-\d+)?$")
+
+
+def slug(name):
+    """Array name of a section title or column, e.g. 'Per base N content' -> 'per_base_n_content'"""
+    return re.sub(r"[^0-9a-z]+", "_", name.lower()).strip("_")
+
+
+def align_positions(labels_per_sample):
+    """
+    Builds the position axis shared by every sample: the union of their row labels,
+    sorted by position when they are all numeric or grouped ('10-14'), else in first-seen order
+    (e.g. the duplication levels '1' ... '>10k').
+
+    Args:
+        labels_per_sample (List[numpy.ndarray]): the row labels of each sample, as strings.
+
+    Returns:
+        numpy.ndarray: the position labels.
+    """
+    positions = list(dict.fromkeys(label for labels in labels_per_sample for label in labels))
+    if all(POSITION_LABEL.match(label) for label in positions):
+        positions.sort(key=lambda label: tuple(int(part) for part in label.split('-')))
+    return np.array(positions, dtype=str)
+
+
+class AggregatedSection:
+    """
+    One numeric section stacked across samples.
+
+    Attributes:
+        title (str): The title of the section.
+        key (str): Name of the column giving the position/bin of each row, e.g. '#Base'.
+        positions (numpy.ndarray): The position labels shared by every sample.
+        metrics (dict): column name -> float64 array of shape (samples, positions),
+            NaN where a sample has no row for the position or lacks the section.
+    """
+    __slots__ = ('title', 'key', 'positions', 'metrics')
+
+    def __init__(self, title, tables):
+        """
+        Stacks the tables of one section.
+
+        Args:
+            title (str): The title of the section.
+            tables (List[SectionTable]): the table of each sample, None when a sample lacks it.
+        """
+        valid = [table is not None and not table.is_empty for table in tables]
+        present = [table for table, is_valid in zip(tables, valid) if is_valid]
+        self.title = title
+        self.key = present[0].names[0] if present else ""
+        labels = [table.column(table.names[0]).astype(str) if is_valid else np.array([], dtype=str)
+                  for table, is_valid in zip(tables, valid)]
+        self.positions = align_positions(labels)
+        lookup = {label: i for i, label in enumerate(self.positions)}
+
+        self.metrics = {}
+        for table in present:
+            for name, labels_of_column in zip(table.names[1:], table.categories[1:]):
+                if labels_of_column is None and name not in self.metrics:
+                    self.metrics[name] = np.full((len(tables), len(self.positions)), np.nan)
+        for row, (table, row_labels, is_valid) in enumerate(zip(tables, labels, valid)):
+            if not is_valid:
+                continue
+            columns = np.fromiter((lookup[label] for label in row_labels), dtype=np.int64,
+                                  count=len(row_labels))
+            for name, column, labels_of_column in zip(table.names[1:], table.columns[1:],
+                                                      table.categories[1:]):
+                if labels_of_column is None:
+                    self.metrics[name][row, columns] = column
+
+    def stats(self, name):
+        """
+        Cross-sample statistics of one metric, computed for every position at once.
+
+        Args:
+            name (str): the metric column.
+
+        Returns:
+            dict: "median" and "mean" (positions,), "percentiles" (len(PERCENTILES), positions)
+                and "zscore" (samples, positions), 0 where every sample has the same value.
+        """
+        matrix = self.metrics[name]
+        with warnings.catch_warnings():
+            # positions no sample has give NaN statistics
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(matrix, axis=0)
+            percentiles = np.nanpercentile(matrix, PERCENTILES, axis=0)
+            mean = np.nanmean(matrix, axis=0)
+            std = np.nanstd(matrix, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zscore = np.where(std > 0, (matrix - mean) / std, np.where(np.isnan(matrix), np.nan, 0.0))
+        return {"median": median, "mean": mean, "percentiles": percentiles, "zscore": zscore}
+
+
+def position_bounds(positions):
+    """First and last base of each position label, e.g. '10-14' -> (10, 14)"""
+    first = []
+    last = []
+    for label in positions:
+        start, _, end = str(label).partition('-')
+        first.append(int(start))
+        last.append(int(end or start))
+    return np.array(first, dtype=np.int64), np.array(last, dtype=np.int64)
+
+
+def adapter_trimming(section, thresholds=DEFAULT_ADAPTER_THRESHOLDS):
+    """
+    Trimming analysis of a stacked Adapter Content section, computed for every sample,
+    position and adapter at once on a (samples, positions, adapters) array.
+
+    Args:
+        section (AggregatedSection): the Adapter Content section of the samples.
+        thresholds (Iterable[float]): adapter content percentages to find the first crossing of.
+
+    Returns:
+        dict: "adapters" (names), "thresholds", "first_position" (thresholds, samples, adapters)
+            first base where the content reaches each threshold, -1 when it never does,
+            "max_content" and "load" (samples, adapters), the load being the mean adapter
+            content over the bases of the read, i.e. the percentage of bases that are adapter.
+    """
+    adapters = list(section.metrics)
+    thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+    n_samples = next(iter(section.metrics.values())).shape[0] if adapters else 0
+    content = (np.stack([section.metrics[name] for name in adapters], axis=2) if adapters
+               else np.empty((n_samples, len(section.positions), 0)))
+    starts, ends = position_bounds(section.positions)
+    widths = (ends - starts + 1).astype(np.float64)[None, :, None]
+
+    present = ~np.isnan(content)
+    # (thresholds, samples, positions, adapters), NaN never crosses
+    crossed = np.where(present, content, -np.inf)[None] >= thresholds[:, None, None, None]
+    first = np.argmax(crossed, axis=2)
+    first_position = np.where(crossed.any(axis=2), starts[first], -1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        load = np.nansum(np.where(present, content, 0.0) * widths, axis=1) / np.sum(present * widths, axis=1)
+        max_content = np.where(present.any(axis=1), np.nanmax(np.where(present, content, -np.inf), axis=1), np.nan)
+    return {"adapters": adapters, "thresholds": thresholds, "first_position": first_position,
+            "max_content": max_content, "load": load}
+
+
+def write_trimming(path, samples, trimming):
+    """
+    Writes the trimming recommendation of each sample: the adapters whose content reaches
+    the lowest threshold, the earliest base each threshold is reached at by any adapter,
+    and the worst adapter with its maximum content and load.
+    """
+    thresholds = trimming["thresholds"]
+    first_position = trimming["first_position"]
+    # earliest crossing over the adapters, -1 kept when no adapter crosses
+    masked = np.where(first_position < 0, np.iinfo(np.int64).max, first_position)
+    earliest = masked.min(axis=2, initial=np.iinfo(np.int64).max)
+    earliest = np.where(earliest == np.iinfo(np.int64).max, -1, earliest)
+    max_content = trimming["max_content"]
+    filled = np.where(np.isnan(max_content), -np.inf, max_content)
+    worst = np.argmax(filled, axis=1) if filled.shape[1] else np.zeros(len(samples), dtype=int)
+    to_trim = first_position[0] >= 0 if len(thresholds) else np.zeros_like(filled, dtype=bool)
+
+    with open(path, 'w', encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(("sample", "recommendation", "adapters",
+                         *(f"first_position_{threshold:g}pct" for threshold in thresholds),
+                         "worst_adapter", "max_content", "adapter_load"))
+        for row, sample in enumerate(samples):
+            names = [name for name, trim in zip(trimming["adapters"], to_trim[row]) if trim]
+            has_data = filled.shape[1] and np.isfinite(filled[row, worst[row]])
+            writer.writerow((
+                sample,
+                "trim" if names else "none",
+                ",".join(names),
+                *("" if position < 0 else position for position in earliest[:, row]),
+                trimming["adapters"][worst[row]] if has_data else "",
+                f"{max_content[row, worst[row]]:.4g}" if has_data else "",
+                f"{trimming['load'][row, worst[row]]:.4g}" if has_data else ""))
+    print("Adapter trimming recommendations written to", path)
+
+
+def load_sample(input_path, use_index=True, titles=AGGREGATED_SECTIONS):
+    """
+    Parses the aggregated sections of one fastqc file.
+
+    Args:
+        input_path (str): the fastqc file.
+        use_index (bool): read plain files through their section index.
+        titles (Iterable[str]): the sections to return the table of.
+
+    Returns:
+        tuple: (statuses {title: status}, tables {title: SectionTable}, error message or None)
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            parser = FastQCParser(input_path, "", use_index=use_index)
+            # every section is read so the statuses array is complete
+            parser.parse_fastqc_to_dictionary()
+            if sections.BASIC_STATS not in parser.fastqc_dict:
+                return {}, {}, "no FastQC sections found"
+            statuses = {title: entry["status"] for title, entry in parser.fastqc_dict.items()}
+            tables = {title: parser.section_table(title)
+                      for title in titles if title in parser.fastqc_dict}
+        except SystemExit:
+            # the parser prints its error before calling sys.exit
+            lines = [line for line in log.getvalue().splitlines() if line.strip()]
+            return {}, {}, lines[-1] if lines else "exited"
+    return statuses, tables, None
+
+
+def aggregate(paths, workers=1, use_index=True, limits=None):
+    """
+    Parses the fastqc files and stacks each numeric section across them.
+
+    Args:
+        paths (List[str]): the fastqc files.
+        workers (int): parse the files over this many worker processes.
+        use_index (bool): read plain files through their section index.
+        limits (QCLimits, optional): recompute the statuses of every file at once against these limits.
+
+    Returns:
+        tuple: (sample names, statuses array (samples, len(ALL_SECTIONS)) with '' for
+            missing sections, {title: AggregatedSection}, {sample: error} of skipped files)
+    """
+    samples = [name for name, _, _ in assign_output_folders(paths, "")]
+    titles = AGGREGATED_SECTIONS
+    if limits is not None:
+        from models.qc_limits import CHECKS
+        titles = tuple(dict.fromkeys(AGGREGATED_SECTIONS + tuple(CHECKS)))
+    if workers is not None and workers <= 1:
+        loaded = [load_sample(path, use_index, titles) for path in paths]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            loaded = list(executor.map(load_sample, paths, [use_index] * len(paths), [titles] * len(paths)))
+
+    errors = {name: error for name, (_, _, error) in zip(samples, loaded) if error}
+    kept = [(name, statuses, tables) for name, (statuses, tables, error) in zip(samples, loaded)
+            if not error]
+    names = [name for name, _, _ in kept]
+    statuses = np.array([[sample_statuses.get(title, "") for title in sections.ALL_SECTIONS]
+                         for _, sample_statuses, _ in kept], dtype=str).reshape(len(kept), -1)
+    if limits is not None:
+        statuses = apply_limits(limits, statuses, [sample_tables for _, _, sample_tables in kept])
+    aggregated = {}
+    for title in AGGREGATED_SECTIONS:
+        tables = [sample_tables.get(title) for _, _, sample_tables in kept]
+        if any(table is not None for table in tables):
+            aggregated[title] = AggregatedSection(title, tables)
+    return names, statuses, aggregated, errors
+
+
+def apply_limits(limits, statuses, sample_tables):
+    """
+    Recomputes the statuses of every sample against the limits in one pass per check.
+
+    Args:
+        limits (QCLimits): the thresholds.
+        statuses (numpy.ndarray): (samples, len(ALL_SECTIONS)) statuses FastQC gave.
+        sample_tables (List[dict]): {title: SectionTable} of each sample.
+
+    Returns:
+        numpy.ndarray: the statuses, replaced where a section could be re-evaluated.
+    """
+    from models.qc_limits import CHECKS, evaluate
+
+    tables = {title: [tables.get(title) for tables in sample_tables] for title in CHECKS
+              if any(title in tables for tables in sample_tables)}
+    updated = statuses.astype(object)
+    for title, new_statuses in evaluate(limits, tables).items():
+        column = sections.ALL_SECTIONS.index(title)
+        updated[:, column] = np.where(new_statuses != "", new_statuses, statuses[:, column])
+    changed = int(np.count_nonzero(updated != statuses))
+    print(f"Statuses re-evaluated with {limits.path or 'the default limits'}: {changed} changed")
+    return updated.astype(str)
+
+
+def write_npz(path, samples, statuses, aggregated, trimming=None):
+    """
+    Writes every stacked section and its statistics to one .npz archive.
+    Arrays are named '<section>.<metric>' (samples x positions), with
+    '<section>.positions', '<section>.<metric>.median', '.percentiles' and '.zscore',
+    and the adapter trimming analysis under 'adapter_content.trimming.*'.
+    """
+    arrays = {
+        "samples": np.array(samples, dtype=str),
+        "sections": np.array(sections.ALL_SECTIONS, dtype=str),
+        "statuses": statuses,
+        "percentiles": np.array(PERCENTILES),
+    }
+    for title, section in aggregated.items():
+        prefix = slug(title)
+        arrays[f"{prefix}.positions"] = section.positions
+        for name, matrix in section.metrics.items():
+            name_prefix = f"{prefix}.{slug(name)}"
+            arrays[name_prefix] = matrix
+            for stat, values in section.stats(name).items():
+                arrays[f"{name_prefix}.{stat}"] = values
+    if trimming is not None:
+        prefix = f"{slug(sections.ADAPTER_CONTENT)}.trimming"
+        for name, values in trimming.items():
+            arrays[f"{prefix}.{name}"] = np.array(values, dtype=str) if name == "adapters" else values
+    np.savez(path, **arrays)
+    print("Aggregated arrays written to", path)
+
+
+def write_parquet(folder, samples, statuses, aggregated):
+    """
+    Writes one long format Parquet table per section (sample, position, metrics and
+    their z-scores) plus '<section>_stats.parquet' and 'statuses.parquet'.
+    Needs the optional pyarrow package.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Error: writing Parquet needs the pyarrow package, install it or use --aggregate-format npz.")
+        sys.exit(1)
+
+    os.makedirs(folder, exist_ok=True)
+    status_columns = {"sample": samples}
+    for position, title in enumerate(sections.ALL_SECTIONS):
+        status_columns[title] = statuses[:, position]
+    pq.write_table(pa.table(status_columns), os.path.join(folder, "statuses.parquet"))
+
+    for title, section in aggregated.items():
+        n_positions = len(section.positions)
+        data = {
+            "sample": np.repeat(np.array(samples, dtype=str), n_positions),
+            "position": np.tile(section.positions, len(samples)),
+        }
+        stats = {"position": section.positions}
+        present = np.zeros(len(samples) * n_positions, dtype=bool)
+        for name, matrix in section.metrics.items():
+            values = section.stats(name)
+            data[name] = matrix.ravel()
+            data[f"{name} zscore"] = values["zscore"].ravel()
+            present |= ~np.isnan(data[name])
+            stats[f"{name} median"] = values["median"]
+            for percentile, row in zip(PERCENTILES, values["percentiles"]):
+                stats[f"{name} p{percentile}"] = row
+        # positions a sample has no row for are left out of the long table
+        table = pa.table({name: column[present] for name, column in data.items()})
+        pq.write_table(table, os.path.join(folder, f"{slug(title)}.parquet"))
+        pq.write_table(pa.table(stats), os.path.join(folder, f"{slug(title)}_stats.parquet"))
+    print("Aggregated tables written to", folder)
+
+
+def write_summary(path, samples, aggregated):
+    """
+    Writes, for every sample, section and metric, the largest absolute z-score
+    and the position it occurs at, so outlying samples can be sorted out quickly.
+    """
+    with open(path, 'w', encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(("sample", "section", "metric", "max_abs_zscore", "position"))
+        for title, section in aggregated.items():
+            for name in section.metrics:
+                magnitude = np.abs(section.stats(name)["zscore"])
+                filled = np.where(np.isnan(magnitude), -1.0, magnitude)
+                worst = np.argmax(filled, axis=1) if filled.shape[1] else np.zeros(len(samples), dtype=int)
+                for sample, column, row in zip(samples, worst, filled):
+                    if row.size and row[column] >= 0:
+                        writer.writerow((sample, title, name, f"{row[column]:.3f}", section.positions[column]))
+    print("Aggregate summary written to", path)
+
+
+def run_aggregate(source, output_folder, output_format="npz", workers=1, use_index=True,
+                  adapter_thresholds=DEFAULT_ADAPTER_THRESHOLDS, limits_path=None):
+    """
+    Aggregates the fastqc files of a batch source into the output folder.
+
+    Args:
+        source (str): directory, glob pattern or manifest (see batch.collect_inputs).
+        output_folder (str): folder to write the arrays and the summary to.
+        output_format (str): 'npz' for one NumPy archive or 'parquet' for a folder of tables.
+        workers (int): number of worker processes parsing the files.
+        use_index (bool): read plain files through their section index.
+        adapter_thresholds (Iterable[float]): adapter content percentages of the trimming analysis.
+        limits_path (str, optional): FastQC style limits.txt the statuses are recomputed against.
+
+    Returns:
+        dict: {sample: error} of the files that could not be parsed.
+    """
+    paths = collect_inputs(source)
+    if not paths:
+        print("No FastQC files found in", source)
+        return {}
+    limits = None
+    if limits_path:
+        from models.qc_limits import QCLimits
+        limits = QCLimits.load(limits_path)
+    samples, statuses, aggregated, errors = aggregate(paths, workers, use_index, limits)
+    for sample, error in errors.items():
+        print(f"Skipping {sample}: {error}")
+    if not samples:
+        return errors
+
+    os.makedirs(output_folder, exist_ok=True)
+    trimming = None
+    if sections.ADAPTER_CONTENT in aggregated:
+        trimming = adapter_trimming(aggregated[sections.ADAPTER_CONTENT], adapter_thresholds)
+    if output_format == "parquet":
+        write_parquet(os.path.join(output_folder, PARQUET_FOLDER), samples, statuses, aggregated)
+    else:
+        write_npz(os.path.join(output_folder, NPZ_FILE), samples, statuses, aggregated, trimming)
+    write_summary(os.path.join(output_folder, SUMMARY_FILE), samples, aggregated)
+    if trimming is not None:
+        write_trimming(os.path.join(output_folder, TRIMMING_FILE), samples, trimming)
+    return errors
@@ -0,0 +1,404 @@
+"""Batch mode: processes many fastqc files over a process pool."""
+# David Oluwasusi 6th November 2024
+
+import argparse
+import contextlib
+import csv
+import fnmatch
+import glob
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import constants as sections
+from models.fastqc_parser import open_fastqc_text
+
+# File names picked up when walking a directory of FastQC outputs
+FASTQC_FILE_PATTERNS = ("fastqc_data*.txt", "fastqc_data*.txt.gz", "*_fastqc.zip")
+SUMMARY_FILE = "batch_summary.tsv"
+SUMMARY_COLUMNS = ("sample", "status", "input", "output", "error", "warn_sections", "fail_sections")
+KMER_RECURRENCE_FILE = "kmer_recurrence.tsv"
+KMER_RECURRENCE_COLUMNS = ("sequence", "samples", "sample_fraction", "total_count", "max_obs_exp", "sample_names")
+SOURCES_FILE = "overrepresented_sources.tsv"
+SOURCES_COLUMNS = ("sequence", "samples", "total_count", "fastqc_source", "matched_source", "strand",
+                   "identity", "overlap", "sample_names")
+
+
+def is_fastqc_file(path):
+    """Checks whether a file, or the fastqc_data.txt of an archive, starts with the ##FastQC header line"""
+    if path.endswith(".zip"):
+        # never a manifest, a zip without fastqc_data.txt is reported when it is parsed
+        return zipfile.is_zipfile(path)
+    try:
+        with open_fastqc_text(path) as f:
+            return f.readline().startswith("##FastQC")
+    except (OSError, UnicodeDecodeError, EOFError):
+        return False
+
+
+def collect_inputs(source):
+    """
+    Expands a batch source into the list of fastqc files it refers to.
+
+    Args:
+        source (str): a directory (walked recursively), a glob pattern,
+            a manifest file listing one fastqc path per line, or a single fastqc file.
+            FastQC `_fastqc.zip` archives and gzipped fastqc files are picked up too,
+            except archives already extracted next to themselves.
+
+    Returns:
+        List[str]: the fastqc file paths, sorted and without duplicates.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in FASTQC_FILE_PATTERNS):
+                    paths.append(os.path.join(root, name))
+        found = set(paths)
+        paths = [path for path in paths if not path.endswith("_fastqc.zip")
+                 or os.path.join(path[:-len(".zip")], "fastqc_data.txt") not in found]
+    elif glob.has_magic(source):
+        paths = [path for path in glob.glob(source, recursive=True) if os.path.isfile(path)]
+    elif os.path.isfile(source) and not is_fastqc_file(source):
+        # Manifest: one path per line, relative paths are resolved against the manifest folder
+        manifest_dir = os.path.dirname(source)
+        paths = []
+        with open(source, 'r', encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(os.path.join(manifest_dir, line))
+    else:
+        paths = [source]
+    return sorted(set(paths))
+
+
+def sample_name(path):
+    """
+    Derives the sample name of a fastqc file, e.g. `S1_fastqc/fastqc_data.txt` -> `S1`,
+    `S1_fastqc.zip` -> `S1` and `data/fastqc_data1.txt.gz` -> `fastqc_data1`.
+    """
+    name = os.path.basename(path)
+    if name.endswith(".gz"):
+        name = name[:-len(".gz")]
+    stem = os.path.splitext(name)[0]
+    if stem == "fastqc_data":
+        stem = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    if stem.endswith("_fastqc"):
+        stem = stem[:-len("_fastqc")]
+    return stem
+
+
+def assign_output_folders(paths, output_folder):
+    """Gives each input its own subfolder of the output folder, de-duplicating sample names"""
+    assigned = []
+    seen = {}
+    for path in paths:
+        name = sample_name(path)
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}_{seen[name]}"
+        assigned.append((name, path, os.path.join(output_folder, name)))
+    return assigned
+
+
+def _init_worker():
+    """Selects the non interactive Agg backend in each worker process"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def process_sample(args, name, input_path, output_folder):
+    """
+    Runs the report for one fastqc file, turning failures into a result row
+    instead of letting them end the whole batch.
+
+    Returns:
+        dict: the summary row of the sample plus its captured console output under "log",
+            with --sqlite what to store for it under "record", the kmers of its
+            K-mer Content table under "kmers", its Overrepresented sequences
+            section text under "overrepresented" and its Adapter Content table under "adapters".
+    """
+    # imported here to avoid a circular import with the cli module
+    from fastqc_reporter import run_report, sqlite_record
+
+    result = {"sample": name, "status": "ok", "input": input_path, "output": output_folder, "error": ""}
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            parser_instance = run_report(args, input_path, output_folder)
+            if args.sqlite:
+                # stored by the main process, the only one writing to the database
+                result["record"] = sqlite_record(args, name, input_path, parser_instance)
+            # the statuses after --limits, the flags written for the sample
+            for status in ("warn", "fail"):
+                result[f"{status}_sections"] = ",".join(
+                    title for title, entry in parser_instance.fastqc_dict.items() if entry["status"] == status)
+            if sections.KMER_CONTENT in parser_instance.fastqc_dict:
+                result["kmers"] = sample_kmers(parser_instance.section_table(sections.KMER_CONTENT))
+            if sections.OVERREPRESENTED_SEQ in parser_instance.fastqc_dict:
+                result["overrepresented"] = parser_instance.fastqc_dict[sections.OVERREPRESENTED_SEQ]["section_content"]
+            if sections.ADAPTER_CONTENT in parser_instance.fastqc_dict:
+                result["adapters"] = parser_instance.section_table(sections.ADAPTER_CONTENT)
+        except SystemExit:
+            # the sections print their error before calling sys.exit
+            lines = [line for line in log.getvalue().splitlines() if line.strip()]
+            result["status"] = "failed"
+            result["error"] = lines[-1] if lines else "exited"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["log"] = log.getvalue()
+    return result
+
+
+def run_batch(args, source, output_folder, workers=None):
+    """
+    Processes every fastqc file of a batch source over a process pool.
+    Each sample is written to its own subfolder of the output folder, or with --sqlite
+    stored by this process in the database, with the summary table next to it.
+    With --contaminants the overrepresented sequences of every sample are matched by this
+    process against one library, so a sequence found in many samples is matched once.
+
+    Args:
+        args (argparse.Namespace): the parsed command line options, applied to every file.
+        source (str): directory, glob pattern or manifest (see collect_inputs).
+        output_folder (str): root folder of the per sample output folders,
+            or the database file with --sqlite.
+        workers (int, optional): number of worker processes, defaults to the CPU count.
+
+    Returns:
+        List[dict]: one summary row per input file, in input order.
+    """
+    samples = assign_output_folders(collect_inputs(source), output_folder)
+    if not samples:
+        print("No FastQC files found in", source)
+        return []
+
+    store = None
+    summary_folder = output_folder
+    if args.sqlite:
+        from models.sqlite_store import SQLiteStore
+        store = SQLiteStore(output_folder)
+        summary_folder = os.path.dirname(os.path.abspath(output_folder))
+        samples = [(name, path, output_folder) for name, path, _ in samples]
+
+    matcher = None
+    worker_args = args
+    if args.contaminants:
+        from models.contaminant_matcher import ContaminantMatcher
+        matcher = ContaminantMatcher.from_file(args.contaminants)
+        worker_args = argparse.Namespace(**{**vars(args), "contaminants": None})
+
+    results = {}
+    kmers = {}
+    overrepresented = {}
+    adapters = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {
+                executor.submit(process_sample, worker_args, name, path, out): name
+                for name, path, out in samples
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                # print each sample's output in one block as soon as it is done
+                print(result.pop("log"), end="")
+                record = result.pop("record", None)
+                if record is not None:
+                    store.add_sample(**record)
+                if "kmers" in result:
+                    kmers[result["sample"]] = result.pop("kmers")
+                if "adapters" in result:
+                    adapters[result["sample"]] = result.pop("adapters")
+                text = result.pop("overrepresented", None)
+                if matcher is not None and text is not None and result["status"] == "ok":
+                    overrepresented[result["sample"]] = text
+                results[result["sample"]] = result
+    finally:
+        if store is not None:
+            store.close()
+
+    ordered = [results[name] for name, _, _ in samples]
+    write_batch_summary(ordered, summary_folder)
+    parsed = [name for name, _, _ in samples if results[name]["status"] == "ok"]
+    if any(name in kmers for name in parsed):
+        # failed samples are left out of the recurrence and of its denominator
+        write_kmer_recurrence([(name, kmers[name]) for name in parsed if name in kmers],
+                              len(parsed), summary_folder)
+    if adapters:
+        write_adapter_trimming(args, [(name, adapters[name]) for name, _, _ in samples if name in adapters],
+                               summary_folder)
+    if matcher is not None:
+        write_sources(matcher, [(name, out, overrepresented[name]) for name, _, out in samples
+                                if name in overrepresented], summary_folder, per_sample=not args.sqlite,
+                      quiet=args.quiet)
+    return ordered
+
+
+def write_batch_summary(results, output_folder):
+    """Writes the per file summary table to batch_summary.tsv in the output folder"""
+    os.makedirs(output_folder, exist_ok=True)
+    summary_path = os.path.join(output_folder, SUMMARY_FILE)
+    with open(summary_path, 'w', encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, delimiter="\t", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+    print("Batch summary written to", summary_path)
+
+
+def print_batch_summary(results):
+    """Prints the per file success/failure table"""
+    if not results:
+        return
+    width = max(len(result["sample"]) for result in results)
+    print(f"{'sample':<{width}}  status  error")
+    for result in results:
+        print(f"{result['sample']:<{width}}  {result['status']:<6}  {result['error']}")
+    failed = sum(result["status"] != "ok" for result in results)
+    print(f"{len(results) - failed} succeeded, {failed} failed")
+
+
+def sample_kmers(table):
+    """
+    The columns of a K-mer Content table needed to compare kmers across samples.
+
+    Returns:
+        dict: "sequence" (object array), "count" and "obs_exp_max" (float arrays).
+    """
+    names = table.names
+    ratio_column = "Obs/Exp Max" if "Obs/Exp Max" in names else "Obs/Exp Overall"
+    return {
+        "sequence": table.column(names[0]),
+        "count": table.column("Count").astype(np.float64),
+        "obs_exp_max": (table.column(ratio_column).astype(np.float64) if ratio_column in names
+                        else np.full(len(table), np.nan)),
+    }
+
+
+def kmer_recurrence(sample_kmers):
+    """
+    Counts in how many samples each kmer is overrepresented.
+
+    Args:
+        sample_kmers (List[tuple]): (sample name, sample_kmers() dict) of each sample
+            with a K-mer Content table.
+
+    Returns:
+        List[tuple]: (sequence, samples, total count, max Obs/Exp, sample names) of
+            every kmer, the most recurring first.
+    """
+    if not sample_kmers:
+        return []
+    sequences = np.concatenate([kmers["sequence"] for _, kmers in sample_kmers]).astype(str)
+    counts = np.concatenate([kmers["count"] for _, kmers in sample_kmers])
+    ratios = np.concatenate([kmers["obs_exp_max"] for _, kmers in sample_kmers])
+    owners = np.repeat(np.arange(len(sample_kmers)), [len(kmers["sequence"]) for _, kmers in sample_kmers])
+
+    unique, inverse = np.unique(sequences, return_inverse=True)
+    inverse = inverse.ravel()
+    samples = np.bincount(inverse, minlength=len(unique))
+    totals = np.bincount(inverse, weights=np.nan_to_num(counts), minlength=len(unique))
+    max_ratios = np.full(len(unique), -np.inf)
+    np.fmax.at(max_ratios, inverse, ratios)
+    max_ratios[np.isinf(max_ratios)] = np.nan
+
+    # the sample names of each kmer, from one stable sort of the rows by kmer
+    by_kmer = np.argsort(inverse, kind="stable")
+    groups = np.split(owners[by_kmer], np.cumsum(samples)[:-1])
+    names = [name for name, _ in sample_kmers]
+
+    order = np.lexsort((-totals, -samples))
+    return [(unique[i], int(samples[i]), totals[i], max_ratios[i], [names[owner] for owner in groups[i]])
+            for i in order]
+
+
+def write_kmer_recurrence(sample_kmers, sample_count, output_folder):
+    """
+    Writes the kmers found across the samples of a batch to kmer_recurrence.tsv in the output folder.
+
+    Args:
+        sample_kmers (List[tuple]): (sample name, kmers) of each sample with a K-mer Content table.
+        sample_count (int): number of samples that parsed successfully, the denominator
+            of the sample_fraction column.
+        output_folder (str): folder of the table.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    recurrence_path = os.path.join(output_folder, KMER_RECURRENCE_FILE)
+    with open(recurrence_path, 'w', encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(KMER_RECURRENCE_COLUMNS)
+        for sequence, samples, total, max_ratio, names in kmer_recurrence(sample_kmers):
+            writer.writerow([sequence, samples, f"{samples / sample_count:.4g}", f"{total:.0f}",
+                             "" if np.isnan(max_ratio) else f"{max_ratio:.6g}", ",".join(names)])
+    print("Kmer recurrence written to", recurrence_path)
+
+
+def write_adapter_trimming(args, sample_tables, output_folder):
+    """
+    Stacks the Adapter Content tables of the samples of a batch and writes their
+    trimming recommendations to adapter_trimming.tsv in the output folder.
+
+    Args:
+        args (argparse.Namespace): the parsed command line options, for the thresholds.
+        sample_tables (List[tuple]): (sample name, Adapter Content SectionTable) of each sample.
+        output_folder (str): folder of the table.
+    """
+    # imported here, aggregate imports this module
+    from aggregate import AggregatedSection, TRIMMING_FILE, adapter_trimming, write_trimming
+
+    section = AggregatedSection(sections.ADAPTER_CONTENT, [table for _, table in sample_tables])
+    os.makedirs(output_folder, exist_ok=True)
+    write_trimming(os.path.join(output_folder, TRIMMING_FILE), [name for name, _ in sample_tables],
+                   adapter_trimming(section, args.adapter_thresholds))
+
+
+def write_sources(matcher, sample_sections, output_folder, per_sample=True, quiet=False):
+    """
+    Matches the overrepresented sequences of the samples of a batch against a contaminant
+    library, each distinct sequence once, and writes the sources.tsv of each sample and
+    the overrepresented_sources.tsv table of the batch.
+
+    Args:
+        matcher (ContaminantMatcher): the library, its matches are shared by all samples.
+        sample_sections (List[tuple]): (sample name, output folder, Overrepresented sequences
+            section text) of each sample.
+        output_folder (str): folder of the batch table.
+        per_sample (bool): also write sources.tsv to each sample's output folder.
+        quiet (bool): do not print a line for every sources.tsv written.
+    """
+    from models.output_writer import OutputWriter
+    from models.overrepresented_seq_section import SOURCES_FILE as SAMPLE_SOURCES_FILE, sources_text
+    from models.section_table import SectionTable
+
+    writer = OutputWriter(background=False, quiet=quiet)
+    found = {}
+    for name, sample_folder, text in sample_sections:
+        table = SectionTable(sections.OVERREPRESENTED_SEQ, text)
+        if per_sample:
+            writer.write(os.path.join(sample_folder, sections.OVERREPRESENTED_SEQ), SAMPLE_SOURCES_FILE,
+                         sources_text(table, matcher), message="Sources successfully written to")
+        if table.is_empty or not len(table):
+            continue
+        for sequence, count, source in zip(table.column(table.names[0]), table.column(table.names[1]),
+                                           table.column(table.names[3])):
+            entry = found.setdefault(sequence, {"samples": [], "count": 0, "source": source})
+            entry["samples"].append(name)
+            entry["count"] += int(count)
+
+    os.makedirs(output_folder, exist_ok=True)
+    sources_path = os.path.join(output_folder, SOURCES_FILE)
+    ordered = sorted(found.items(), key=lambda item: (-len(item[1]["samples"]), -item[1]["count"]))
+    with open(sources_path, 'w', encoding="utf-8", newline="") as f:
+        rows = csv.writer(f, delimiter="\t")
+        rows.writerow(SOURCES_COLUMNS)
+        for sequence, entry in ordered:
+            match = matcher.match(sequence)
+            matched = ["No Hit", "", "", ""] if match is None else [
+                match.name, match.strand, f"{match.identity:.1f}", match.overlap]
+            rows.writerow([sequence, len(entry["samples"]), entry["count"], entry["source"], *matched,
+                             ",".join(entry["samples"])])
+    print(f"Overrepresented sources written to {sources_path} "
+          f"({len(matcher.matches)} distinct sequences matched)")
@@ -0,0 +1,80 @@
+"""Startup time regression check for summary-only runs of the cli tool."""
+# David Oluwasusi 6th November 2024
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(REPO_ROOT, "fastqc_reporter.py")
+DEFAULT_INPUT = os.path.join(REPO_ROOT, "data", "fastqc_data1.txt")
+# Libraries that only plotting sections may load
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "seaborn")
+# Runs that never plot: summary only, and the report-only sections
+SUMMARY_RUNS = ((), ("-l",), ("-o",), ("-l", "-o"))
+
+
+def time_run(input_path, output_folder, flags, repeats):
+    """Returns the best wall time in seconds of `python fastqc_reporter.py input output flags`"""
+    command = [sys.executable, CLI, input_path, output_folder, *flags]
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def heavy_imports(input_path, output_folder, flags):
+    """Returns the heavy modules imported by a run, using python -X importtime"""
+    command = [sys.executable, "-X", "importtime", CLI, input_path, output_folder, *flags]
+    result = subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    imported = set()
+    for line in result.stderr.splitlines():
+        name = line.rsplit("|", 1)[-1].strip()
+        if name.split(".")[0] in HEAVY_MODULES:
+            imported.add(name.split(".")[0])
+    return sorted(imported)
+
+
+def baseline_time(repeats):
+    """Best wall time of a bare interpreter start, used to make the budget machine independent"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Checks every summary-only run against the time budget and the import list"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=DEFAULT_INPUT, help="FastQC file to run on.")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per command, the best time is kept.")
+    parser.add_argument("--budget", type=float, default=0.25,
+                        help="Allowed seconds on top of a bare interpreter start.")
+    args = parser.parse_args()
+
+    interpreter = baseline_time(args.repeats)
+    print(f"bare interpreter start: {interpreter:.3f}s, budget: +{args.budget:.3f}s")
+    failed = False
+    with tempfile.TemporaryDirectory() as output_folder:
+        for flags in SUMMARY_RUNS:
+            elapsed = time_run(args.input, output_folder, flags, args.repeats)
+            loaded = heavy_imports(args.input, output_folder, flags)
+            ok = elapsed <= interpreter + args.budget and not loaded
+            failed = failed or not ok
+            label = " ".join(flags) or "(summary)"
+            print(f"{'ok' if ok else 'FAIL':<4}  {label:<10} {elapsed:.3f}s"
+                  + (f"  imported: {', '.join(loaded)}" if loaded else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
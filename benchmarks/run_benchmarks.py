@@ -0,0 +1,163 @@
+"""Benchmarks of the parse, report and plot stages on synthetic FastQC files.
+
+Each run times parse_fastqc_to_dictionary, every get_* method and get_all separately,
+appends the timings with the current git commit to a results file, and compares
+them with the last run recorded at the same scale to catch regressions.
+"""
+# David Oluwasusi 6th November 2024
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+
+from benchmarks.synthetic import write_fastqc  # noqa: E402
+from models import FastQCParser  # noqa: E402
+from models.fastqc_parser import SECTION_GETTERS  # noqa: E402
+
+DEFAULT_RESULTS = os.path.join(REPO_ROOT, "benchmarks", "results.jsonl")
+
+
+def git_commit():
+    """Short hash of the checked out commit, with a -dirty suffix for local changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def best_of(repeats, setup, stage):
+    """Best wall time of `stage(setup())` over the repeats, setup is not timed"""
+    best = float("inf")
+    for _ in range(repeats):
+        state = setup()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            stage(state)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_stages(input_path, repeats):
+    """
+    Times every stage on one fastqc file.
+
+    Returns:
+        dict: stage name -> best wall time in seconds.
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as output_folder:
+        def fresh_parser(use_index=True):
+            return FastQCParser(input_path, output_folder, use_index=use_index)
+
+        def parsed_parser():
+            parser = fresh_parser()
+            parser.parse_fastqc_to_dictionary()
+            return parser
+
+        timings["parse"] = best_of(
+            repeats, lambda: fresh_parser(use_index=False), lambda p: p.parse_fastqc_to_dictionary())
+        timings["parse_indexed"] = best_of(
+            repeats, fresh_parser, lambda p: p.parse_fastqc_to_dictionary())
+        for getter in dict.fromkeys(SECTION_GETTERS.values()):
+            timings[getter] = best_of(
+                repeats, parsed_parser, lambda p, name=getter: getattr(p, name)())
+        timings["get_all"] = best_of(repeats, parsed_parser, lambda p: p.get_all())
+    return timings
+
+
+def load_results(path):
+    """Reads the recorded runs, oldest first"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_regressions(previous, timings, tolerance, min_seconds):
+    """
+    Compares the timings with a previous run.
+
+    Returns:
+        List[str]: one message per stage slower than the previous run by more than
+            `tolerance` (relative) and `min_seconds` (absolute).
+    """
+    regressions = []
+    for stage, seconds in timings.items():
+        before = previous["timings"].get(stage)
+        if before is None:
+            continue
+        if seconds > before * (1 + tolerance) and seconds - before > min_seconds:
+            regressions.append(
+                f"{stage}: {before:.3f}s -> {seconds:.3f}s (+{(seconds / before - 1) * 100:.0f}%)"
+                f" since {previous['commit']}")
+    return regressions
+
+
+def main():
+    """Generates the synthetic input, runs the benchmarks and checks for regressions"""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--read-length", type=int, default=150, help="Cycles of the synthetic run.")
+    parser.add_argument("--tiles", type=int, default=112, help="Tiles of the synthetic run.")
+    parser.add_argument("--overrepresented", type=int, default=80, help="Overrepresented sequences.")
+    parser.add_argument("--kmers", type=int, default=20, help="Kmer rows.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per stage, the best time is kept.")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON lines file of recorded runs.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slow down reported as a regression.")
+    parser.add_argument("--min-seconds", type=float, default=0.02,
+                        help="Absolute slow down below which differences are ignored.")
+    parser.add_argument("--no-record", action="store_true", help="Do not append this run to the results.")
+    args = parser.parse_args()
+
+    params = {
+        "read_length": args.read_length,
+        "tiles": args.tiles,
+        "overrepresented": args.overrepresented,
+        "kmers": args.kmers,
+    }
+    with tempfile.TemporaryDirectory() as input_folder:
+        input_path = write_fastqc(os.path.join(input_folder, "fastqc_data.txt"), **params)
+        timings = run_stages(input_path, args.repeats)
+
+    run = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "params": params,
+        "timings": timings,
+    }
+    for stage, seconds in timings.items():
+        print(f"{stage:<22} {seconds:8.3f}s")
+
+    previous = [result for result in load_results(args.results) if result["params"] == params]
+    regressions = find_regressions(previous[-1], timings, args.tolerance, args.min_seconds) if previous else []
+
+    if not args.no_record:
+        with open(args.results, 'a', encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+
+    if regressions:
+        print("Performance regressions:")
+        for message in regressions:
+            print("  " + message)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
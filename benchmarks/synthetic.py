@@ -0,0 +1,126 @@
+"""Generator of synthetic fastqc_data.txt files at configurable scale."""
+# David Oluwasusi 6th November 2024
+
+import argparse
+import random
+
+BASES = "ACGT"
+ADAPTERS = (
+    "Illumina Universal Adapter",
+    "Illumina Small RNA Adapter",
+    "Nextera Transposase Sequence",
+    "SOLID Small RNA Adapter",
+)
+DUPLICATION_LEVELS = [str(level) for level in range(1, 10)] + [
+    ">10", ">50", ">100", ">500", ">1k", ">5k", ">10k"]
+SOURCES = ("No Hit", "Illumina Single End PCR Primer 1 (100% over 50bp)",
+           "TruSeq Adapter, Index 1 (97% over 36bp)")
+
+
+def tile_ids(count):
+    """Illumina style tile IDs: surface, swath and tile number, e.g. 1101, 2214"""
+    ids = []
+    per_swath = max(1, -(-count // 4))
+    for surface in (1, 2):
+        for swath in (1, 2):
+            for tile in range(1, per_swath + 1):
+                ids.append(surface * 1000 + swath * 100 + tile if per_swath < 100
+                           else surface * 10000 + swath * 1000 + tile)
+    return ids[:count]
+
+
+def random_sequence(rng, length):
+    """Random nucleotide sequence"""
+    return "".join(rng.choice(BASES) for _ in range(length))
+
+
+def generate_fastqc(read_length=150, tiles=112, overrepresented=80, kmers=20, seed=0):
+    """
+    Builds the text of a synthetic FastQC 0.11 report with every module.
+
+    Args:
+        read_length (int): number of cycles, sets the size of every per-base module.
+        tiles (int): number of tiles in the per tile module (tiles x read_length rows).
+        overrepresented (int): number of overrepresented sequences.
+        kmers (int): number of kmer rows.
+        seed (int): seed of the random generator, the output is deterministic.
+
+    Returns:
+        str: the fastqc_data.txt content.
+    """
+    rng = random.Random(seed)
+    out = ["##FastQC\t0.11.9\n"]
+
+    def module(title, status, header, rows):
+        out.append(f">>{title}\t{status}\n")
+        out.append(header + "\n")
+        out.extend("\t".join(str(value) for value in row) + "\n" for row in rows)
+        out.append(">>END_MODULE\n")
+
+    module("Basic Statistics", "pass", "#Measure\tValue", [
+        ("Filename", "synthetic.fastq.gz"),
+        ("File type", "Conventional base calls"),
+        ("Encoding", "Sanger / Illumina 1.9"),
+        ("Total Sequences", 40000000),
+        ("Sequences flagged as poor quality", 0),
+        ("Sequence length", read_length),
+        ("%GC", 48),
+    ])
+    module("Per base sequence quality", "pass",
+           "#Base\tMean\tMedian\tLower Quartile\tUpper Quartile\t10th Percentile\t90th Percentile",
+           [(base, 36 - base / read_length * 4 + rng.random(), 36.0, 34.0, 37.0, 30.0, 38.0)
+            for base in range(1, read_length + 1)])
+    module("Per tile sequence quality", "pass", "#Tile\tBase\tMean",
+           [(tile, base, rng.gauss(0, 0.5)) for tile in tile_ids(tiles)
+            for base in range(1, read_length + 1)])
+    module("Per sequence quality scores", "pass", "#Quality\tCount",
+           [(quality, float(int(1e6 * 2 ** -abs(quality - 36)))) for quality in range(2, 42)])
+    module("Per base sequence content", "warn", "#Base\tG\tA\tT\tC",
+           [(base, *(25 + rng.uniform(-3, 3) for _ in range(4))) for base in range(1, read_length + 1)])
+    module("Per sequence GC content", "pass", "#GC Content\tCount",
+           [(gc, 1e5 * 2.718 ** (-((gc - 48) / 10) ** 2)) for gc in range(0, 101)])
+    module("Per base N content", "pass", "#Base\tN-Count",
+           [(base, rng.random() * 0.05) for base in range(1, read_length + 1)])
+    module("Sequence Length Distribution", "pass", "#Length\tCount",
+           [(read_length, 4.0e7)])
+    out.append(">>Sequence Duplication Levels\twarn\n")
+    out.append("#Total Deduplicated Percentage\t62.5\n")
+    out.append("#Duplication Level\tPercentage of deduplicated\tPercentage of total\n")
+    out.extend(f"{level}\t{100 / 2 ** (i + 1)}\t{100 / 2 ** (i + 1.5)}\n"
+               for i, level in enumerate(DUPLICATION_LEVELS))
+    out.append(">>END_MODULE\n")
+    module("Overrepresented sequences", "warn", "#Sequence\tCount\tPercentage\tPossible Source",
+           [(random_sequence(rng, read_length), 200000 - i, 0.5 - i * 1e-4, rng.choice(SOURCES))
+            for i in range(overrepresented)])
+    module("Adapter Content", "pass", "#Position\t" + "\t".join(ADAPTERS),
+           [(position, *(position / read_length * rng.random() for _ in ADAPTERS))
+            for position in range(1, read_length + 1)])
+    module("Kmer Content", "fail", "#Sequence\tCount\tPValue\tObs/Exp Max\tMax Obs/Exp Position",
+           [(random_sequence(rng, 7), rng.randint(1000, 5000), 0.0, rng.uniform(5, 40),
+             rng.randint(1, read_length)) for _ in range(kmers)])
+    return "".join(out)
+
+
+def write_fastqc(path, **params):
+    """Writes a synthetic fastqc file, see generate_fastqc for the parameters"""
+    with open(path, 'w', encoding="utf-8") as f:
+        f.write(generate_fastqc(**params))
+    return path
+
+
+def main():
+    """Writes one synthetic fastqc file"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output_path", help="Path of the fastqc file to write.")
+    parser.add_argument("--read-length", type=int, default=150)
+    parser.add_argument("--tiles", type=int, default=112)
+    parser.add_argument("--overrepresented", type=int, default=80)
+    parser.add_argument("--kmers", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_fastqc(args.output_path, read_length=args.read_length, tiles=args.tiles,
+                 overrepresented=args.overrepresented, kmers=args.kmers, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
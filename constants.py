@@ -14,3 +14,22 @@ SEQ_DUPLICATION_LEVEL = 'Sequence Duplication Levels'
 OVERREPRESENTED_SEQ = 'Overrepresented sequences'
 ADAPTER_CONTENT = 'Adapter Content'
 KMER_CONTENT = 'Kmer Content'
+
+# Section titles in the order FastQC writes them
+ALL_SECTIONS = (
+    BASIC_STATS,
+    PER_BASE_SEQ,
+    PER_TILE_SEQ,
+    PER_SEQ_QUALITY_SCORES,
+    PER_BASE_SEQ_CONTENT,
+    PER_SEQ_GC_CONTENT,
+    PER_BASE_N_CONTENT,
+    SEQ_LEN_DIST,
+    SEQ_DUPLICATION_LEVEL,
+    OVERREPRESENTED_SEQ,
+    ADAPTER_CONTENT,
+    KMER_CONTENT,
+)
+
+# Version of the reporter, recorded in output manifests so outputs are regenerated on upgrade
+REPORTER_VERSION = "1.1.0"
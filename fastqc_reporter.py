@@ -2,9 +2,52 @@
 # David Oluwasusi 6th November 2024
 
 import argparse
+import json
+import os
+import sys
 from models import FastQCParser
+from models.fastqc_parser import open_fastqc_text
+from models.output_writer import MemoryWriter, OutputWriter
+from models.plot_style import BACKENDS, PlotStyle
+from models.profiler import StageProfiler
 import constants as sections
 
+# Section title each optional flag needs from the fastqc file
+FLAG_SECTIONS = {
+    "per_base_seq_qual": sections.BASIC_STATS,
+    "per_tile_seq_qual": sections.PER_TILE_SEQ,
+    "per_seq_qual_scores": sections.PER_SEQ_QUALITY_SCORES,
+    "per_base_seq_content": sections.PER_BASE_SEQ_CONTENT,
+    "per_seq_GC_cont": sections.PER_SEQ_GC_CONTENT,
+    "per_base_N_cont": sections.PER_BASE_N_CONTENT,
+    "seq_len_dist": sections.SEQ_LEN_DIST,
+    "seq_dup": sections.SEQ_DUPLICATION_LEVEL,
+    "over_seq": sections.OVERREPRESENTED_SEQ,
+    "adap_cont": sections.ADAPTER_CONTENT,
+    "kmer_count": sections.KMER_CONTENT,
+}
+
+
+# Folder of the output folder --save-cache writes the run cache to
+RUN_CACHE_FOLDER = "run_cache"
+
+
+def requested_sections(args):
+    """
+    Works out which sections have to be parsed for the passed options.
+    Basic Statistics is always needed for the summary.
+
+    Returns:
+        set | None: section titles to parse, None when every section is needed.
+    """
+    if args.all:
+        return None
+    requested = {sections.BASIC_STATS}
+    for flag, title in FLAG_SECTIONS.items():
+        if getattr(args, flag):
+            requested.add(title)
+    return requested
+
 
 def main():
     """
@@ -18,8 +61,8 @@ def main():
         """)
 
     #Compulsory parameters
-    parser.add_argument("input_path", metavar="FastQC file input path", type=str, help="FastQC input file path.")
-    parser.add_argument("output_folder_path", metavar="FastQC output folder path", type=str, help="FastQC output folder path.")
+    parser.add_argument("input_path", metavar="FastQC file input path", type=str, help="FastQC input file path (a directory, glob or manifest with --batch), - reads standard input.")
+    parser.add_argument("output_folder_path", metavar="FastQC output folder path", type=str, nargs="?", help="FastQC output folder path (not used with --ndjson).")
 
     #Optional arguments
     parser.add_argument("-b", "--per_base_seq_qual", action="store_true", help="Process the per base sequence quality section")
@@ -45,52 +88,293 @@ def main():
     parser.add_argument("-k", "--kmer_count", action="store_true", help="Process the K-mer Content section")
 
     parser.add_argument("-a", "--all", action="store_true", help="Process all the sections")
-    args = parser.parse_args()
 
-    fastqc_file_input = args.input_path
-    output_folder = args.output_folder_path
+    parser.add_argument("--no-index", action="store_true", help="Read the whole file instead of using the section index sidecar")
 
-    parser_instance = FastQCParser(fastqc_file_input, output_folder)
+    parser.add_argument("--no-reports", action="store_true", help="Skip writing report.txt files, flags and plots are still produced")
 
-    parser_instance.parse_fastqc_to_dictionary()
+    parser.add_argument("--tile-renderer", choices=("auto", "seaborn", "raster"), default="auto", help="Per tile heatmap renderer, raster draws the tile x cycle matrix as one image for large flowcells")
 
-    FastQCParser.print_summary(parser_instance.fastqc_dict[sections.BASIC_STATS]["section_content"])
+    parser.add_argument("--tile-bin", type=int, default=1, help="Raster per tile heatmap: average this many consecutive tiles per row")
+
+    parser.add_argument("--cycle-bin", type=int, default=1, help="Raster per tile heatmap: average this many consecutive cycles per column")
+
+    parser.add_argument("--tile-groups", choices=("surface", "lane", "none"), default="surface", help="Raster per tile heatmap: group tiles by the lane/surface parsed from the tile ID")
+
+    parser.add_argument("--kmer-metrics", nargs="+", choices=("Count", "PValue", "Obs/Exp Overall", "Obs/Exp Max", "all"), default=None, help="K-mer Content metrics to plot the top kmers of, each to its own kmer_content_by_<metric>.png (defaults to Count, 'all' plots every metric of the table)")
+
+    parser.add_argument("--kmer-top-n", type=int, default=20, help="Number of kmers in the K-mer Content plots")
+
+    parser.add_argument("--kmer-positions", action="store_true", help="Also plot the distribution of the max Obs/Exp positions of the kmers and a position x kmer heat summary")
+
+    parser.add_argument("--contaminants", default=None, help="FASTA file (or FastQC contaminant/adapter list) of adapters and contaminants to match the Overrepresented sequences against, both strands, written to sources.tsv")
+
+    parser.add_argument("--limits", default=None, help="FastQC style limits.txt: recompute the pass/warn/fail status of each section from its data against these thresholds before writing flag.txt and the batch summary")
+
+    parser.add_argument("--plot-backend", choices=BACKENDS, default="seaborn", help="Plotting backend, fast draws the same charts with plain matplotlib calls on the parsed arrays without loading seaborn")
+
+    parser.add_argument("--dpi", type=int, default=None, help="Resolution of the plots (matplotlib's default, 100, when not given)")
+
+    parser.add_argument("--png-compression", type=int, choices=range(10), default=None, metavar="{0-9}", help="zlib level of the PNG plots, lower levels encode faster and give larger files")
+
+    parser.add_argument("--no-plots", action="store_true", help="Skip the plots, only flags and reports are written")
+
+    parser.add_argument("--dashboard", choices=("png", "svg"), default=None, help="Also draw the plots of the selected sections as the panels of one figure, dashboard.png or dashboard.svg in the output folder (combine with --no-plots for the dashboard only)")
+
+    parser.add_argument("--force", action="store_true", help="Regenerate every selected section, even when its outputs are up to date")
+
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes rendering the plots of the selected sections")
+
+    parser.add_argument("--save-cache", action="store_true", help="Also write every parsed section to a binary run cache in <output folder>/run_cache, which can be passed back as the input path")
+
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print a line for every report, flag and plot written")
+
+    parser.add_argument("--profile", action="store_true", help="Record wall time and CPU time of each stage to profile.json in the output folder")
+
+    parser.add_argument("--profile-memory", action="store_true", help="Like --profile, also recording the tracemalloc peak of each stage. Tracing slows the run down several times, so its timings are not comparable with --profile ones")
 
-    if args.per_base_seq_qual:
-        parser_instance.get_base()
+    parser.add_argument("--ndjson", action="store_true", help="Write each section as one JSON line (title, status, columns and typed rows) to standard output as soon as it is read, instead of writing files")
 
-    if args.per_tile_seq_qual:
-        parser_instance.get_tile_seq()
+    parser.add_argument("--batch", action="store_true", help="Treat the input path as a directory, glob pattern or manifest of FastQC files")
 
-    if args.per_seq_qual_scores:
-        parser_instance.get_seq_qual_scores()
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes used by --batch, --watch and --aggregate (defaults to the CPU count)")
 
-    if args.per_base_seq_content:
-        parser_instance.get_base_seq_content()
+    parser.add_argument("--watch", action="store_true", help="Keep polling the input directory and report every new or changed FastQC file with a pool of warm worker processes, remembering processed files across restarts")
 
-    if args.per_seq_GC_cont:
-        parser_instance.get_seq_gc_content()
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between two scans of --watch")
 
-    if args.per_base_N_cont:
-        parser_instance.get_base_n_content()
+    parser.add_argument("--once", action="store_true", help="With --watch, process the files that are new or changed now and exit")
 
-    if args.seq_len_dist:
-        parser_instance.get_seq_len_dist()
+    parser.add_argument("--sqlite", action="store_true", help="Treat the output path as a SQLite database file and store the statuses, tables and plots of every sample in it instead of writing a folder per section")
 
-    if args.seq_dup:
-        parser_instance.get_seq_dup()
+    parser.add_argument("--serve", action="store_true", help="Serve the FastQC files of the input directory, glob or manifest over a local HTTP API (GET /runs/<id>/sections/<title> and .../plot.png) instead of writing files")
 
-    if args.over_seq:
-        parser_instance.get_overep_seq()
+    parser.add_argument("--host", default="127.0.0.1", help="Address --serve listens on")
 
-    if args.adap_cont:
-        parser_instance.get_adap_cont()
+    parser.add_argument("--port", type=int, default=8000, help="Port --serve listens on")
 
-    if args.kmer_count:
-        parser_instance.get_kmer_cont()
+    parser.add_argument("--cache-mb", type=float, default=256, help="Size in MB of the --serve cache of parsed runs and rendered plots")
+
+    parser.add_argument("--aggregate", action="store_true", help="Stack the numeric sections of every FastQC file of the input directory, glob or manifest into sample x position arrays with cross-sample statistics")
+
+    parser.add_argument("--adapter-thresholds", nargs="+", type=float, default=[5.0, 10.0], help="Adapter content percentages whose first crossing per adapter is reported in the adapter_trimming.tsv recommendations of --batch and --aggregate")
+
+    parser.add_argument("--aggregate-format", choices=("npz", "parquet"), default="npz", help="File format of --aggregate, parquet needs the pyarrow package")
+    args = parser.parse_args()
+    if args.profile_memory:
+        args.profile = True
+    if args.jobs < 1:
+        parser.error("-j/--jobs must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("-w/--workers must be at least 1")
+    if args.dpi is not None and args.dpi < 1:
+        parser.error("--dpi must be at least 1")
+    if args.poll_interval <= 0:
+        parser.error("--poll-interval must be greater than 0")
+
+    if args.ndjson:
+        stream_ndjson(args, args.input_path)
+        return
+
+    if args.serve:
+        from serve import run_server
+        run_server(args.input_path, args.host, args.port, args.cache_mb,
+                   use_index=not args.no_index, plot_options=plot_options(args), quiet=args.quiet,
+                   plot_style=PlotStyle(args.plot_backend, args.dpi, args.png_compression))
+        return
+
+    if args.output_folder_path is None:
+        parser.error("the output folder path is required unless --ndjson or --serve is passed")
+
+    if args.sqlite and args.save_cache:
+        parser.error("--save-cache writes files into the output folder, it cannot be combined with --sqlite")
+
+    if args.aggregate:
+        from aggregate import run_aggregate
+        errors = run_aggregate(args.input_path, args.output_folder_path, args.aggregate_format,
+                               args.workers, use_index=not args.no_index,
+                               adapter_thresholds=args.adapter_thresholds, limits_path=args.limits)
+        if errors:
+            sys.exit(1)
+        return
+
+    if args.watch:
+        from watch import run_watch
+        results = run_watch(args, args.input_path, args.output_folder_path, args.workers,
+                            args.poll_interval, args.once)
+        if args.once and any(result["status"] != "ok" for result in results):
+            sys.exit(1)
+        return
+
+    if args.batch:
+        from batch import run_batch, print_batch_summary
+        results = run_batch(args, args.input_path, args.output_folder_path, args.workers)
+        print_batch_summary(results)
+        if any(result["status"] != "ok" for result in results):
+            sys.exit(1)
+        return
+
+    parser_instance = run_report(args, args.input_path, args.output_folder_path)
+    if args.sqlite:
+        from batch import sample_name
+        from models.sqlite_store import SQLiteStore
+        with SQLiteStore(args.output_folder_path) as store:
+            store.add_sample(**sqlite_record(args, sample_name(args.input_path), args.input_path, parser_instance))
+
+
+def plot_options(args):
+    """
+    Collects the plot settings passed on the command line.
+
+    Returns:
+        dict: section title -> keyword arguments for that section's plot_section.
+    """
+    return {
+        sections.PER_TILE_SEQ: {
+            "renderer": args.tile_renderer,
+            "tile_bin": args.tile_bin,
+            "cycle_bin": args.cycle_bin,
+            "group_by": None if args.tile_groups == "none" else args.tile_groups,
+        },
+        sections.KMER_CONTENT: {
+            "top_n": args.kmer_top_n,
+            "metrics": args.kmer_metrics,
+            "positions": args.kmer_positions,
+        },
+    }
+
+
+def section_record(title, status, text):
+    """
+    Builds the NDJSON record of one section.
+
+    Returns:
+        dict: {"title", "status", "columns", "rows", "preamble"}, rows being lists of
+            typed values (None for empty cells).
+
+    Raises:
+        ValueError: when the section table cannot be parsed.
+    """
+    from models.section_table import SectionTable
+
+    table = SectionTable(title, text)
+    return {
+        "title": title,
+        "status": status,
+        "columns": list(table.names),
+        "rows": table.rows(),
+        "preamble": table.preamble,
+    }
+
+
+def stream_ndjson(args, input_path):
+    """
+    Writes each section of a fastqc file (or of standard input for '-') to standard
+    output as one JSON line as soon as its END_MODULE is read, holding one section
+    in memory at a time. Section flags select the sections, all are written when none is given.
+    Errors go to standard error so the stream stays valid.
+    """
+    requested = requested_sections(args) if args.all or any(
+        getattr(args, flag) for flag in FLAG_SECTIONS) else None
+    try:
+        with open_fastqc_text(input_path) as lines:
+            for title, status, text in FastQCParser.iter_sections(lines, requested):
+                try:
+                    record = section_record(title, status, text)
+                except ValueError as ve:
+                    print(f"Error: The section '{title}' could not be parsed ({ve}).", file=sys.stderr)
+                    sys.exit(1)
+                sys.stdout.write(json.dumps(record, allow_nan=False) + "\n")
+                sys.stdout.flush()
+    except FileNotFoundError:
+        print("passed path", input_path, "does not exist", file=sys.stderr)
+        sys.exit(1)
+    except BrokenPipeError:
+        # the reader closed the pipe, e.g. `| head`
+        sys.stderr.close()
+        sys.exit(0)
+
+
+def sqlite_record(args, name, input_path, parser_instance):
+    """
+    Collects what --sqlite stores for one sample after run_report.
+
+    Returns:
+        dict: keyword arguments of SQLiteStore.add_sample.
+    """
+    profile = None
+    if args.profile:
+        profile = parser_instance.profiler.to_dict(input=input_path, jobs=args.jobs)
+    return {
+        "name": name,
+        "input_path": input_path,
+        "fastqc_dict": parser_instance.fastqc_dict,
+        "files": parser_instance.writer.files,
+        "profile": profile,
+    }
+
+
+def run_report(args, input_path, output_folder):
+    """
+    Parses a single fastqc file and processes the sections selected by the options.
+
+    Args:
+        args (argparse.Namespace): the parsed command line options.
+        input_path (str): path of the fastqc file or run cache.
+        output_folder (str): folder to write the reports, flags and plots to,
+            unused with --sqlite where the outputs are kept in memory for the database.
+
+    Returns:
+        FastQCParser: the parser, holding the parsed sections.
+    """
+    profiler = StageProfiler(memory=args.profile_memory) if args.profile else None
+    contaminants = None
+    if args.contaminants:
+        from models.contaminant_matcher import load_matcher
+        contaminants = load_matcher(args.contaminants)
+    parser_instance = FastQCParser(
+        input_path,
+        "" if args.sqlite else output_folder,
+        use_index=not args.no_index,
+        # the report text is stored in the database
+        write_reports=not (args.no_reports or args.sqlite),
+        jobs=args.jobs,
+        plot_options=plot_options(args),
+        incremental=not args.sqlite,
+        force=args.force,
+        profiler=profiler,
+        writer=MemoryWriter() if args.sqlite else OutputWriter(quiet=args.quiet),
+        contaminants=contaminants,
+        plot_style=PlotStyle(args.plot_backend, args.dpi, args.png_compression),
+        plots=not args.no_plots)
+
+    parser_instance.parse_fastqc_to_dictionary(None if args.save_cache else requested_sections(args))
+
+    if args.save_cache:
+        parser_instance.save_cache(os.path.join(output_folder, RUN_CACHE_FOLDER))
+
+    if args.limits:
+        from models.qc_limits import QCLimits
+        for title, (fastqc_status, status) in parser_instance.apply_limits(QCLimits.load(args.limits)).items():
+            print(f"{title}: {fastqc_status} -> {status} with {args.limits}")
+
+    FastQCParser.print_summary(parser_instance.fastqc_dict[sections.BASIC_STATS]["section_content"])
+
+    # Sections selected by individual flags, in the order the flags are listed
+    parser_instance.get_sections(
+        [title for flag, title in FLAG_SECTIONS.items() if getattr(args, flag)])
 
     if args.all:
         parser_instance.get_all()
 
+    if args.dashboard:
+        parser_instance.write_dashboard(requested_sections(args), args.dashboard)
+
+    if profiler is not None and not args.sqlite:
+        profiler.write(os.path.join(output_folder, "profile.json"),
+                       input=input_path, jobs=args.jobs)
+    return parser_instance
+
+
 if __name__ == "__main__":
     main()
@@ -1,13 +1,43 @@
 """models to manage each section of the fastqc files"""
 # David Oluwasusi 6th November 2024
 
+import importlib
+
+# Import policy of the reporter: a module that only some runs need (matplotlib,
+# seaborn, pandas, NumPy, sqlite3, the process pools, and the optional features such
+# as the contaminant matcher, QC limits, dashboard, aggregation, watch and serve modes)
+# is imported inside the function that uses it, so a run only loads what its options
+# ask for. benchmarks/check_startup.py keeps summary-only runs within the budget.
+
 from .base_section import Section
-from .per_tile_seq_section import PerTileSeqSection
 from .fastqc_parser import FastQCParser
-from .per_seq_qual_section import PerSeqQualSection
-from .per_base_seq_content_section import PerBaseSeqContentSection
-from .per_seq_gc_content_section import PerSeqGCContentSection
-from .per_base_n_content_section import PerBaseNContentSection
-from .seq_duplication_level_section import SeqDuplicationLevelSection
-from .adapter_content_section import AdapterContentSection
-from .kmer_content_section import KmerContentSection
+
+# The plotting sections import pandas, seaborn and matplotlib, so they are only
+# loaded the first time they are used (PEP 562 module __getattr__)
+_LAZY_MODELS = {
+    "PerTileSeqSection": ".per_tile_seq_section",
+    "PerSeqQualSection": ".per_seq_qual_section",
+    "PerBaseSeqContentSection": ".per_base_seq_content_section",
+    "PerSeqGCContentSection": ".per_seq_gc_content_section",
+    "PerBaseNContentSection": ".per_base_n_content_section",
+    "SeqDuplicationLevelSection": ".seq_duplication_level_section",
+    "AdapterContentSection": ".adapter_content_section",
+    "KmerContentSection": ".kmer_content_section",
+    "OverrepresentedSeqSection": ".overrepresented_seq_section",
+    "SectionTable": ".section_table",
+}
+
+__all__ = ["Section", "FastQCParser", *_LAZY_MODELS]
+
+
+def __getattr__(name):
+    if name in _LAZY_MODELS:
+        module = importlib.import_module(_LAZY_MODELS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(__all__)
@@ -2,11 +2,9 @@
 # David Oluwasusi 6th November 2024
 
 import sys
-import os
-import pandas as pd
-import seaborn as sns
 import matplotlib.pyplot as plt
 from  models.base_section import Section
+from models.plot_style import category_axis, set_category_ticks
 
 class AdapterContentSection(Section):
     """
@@ -17,28 +15,35 @@ class AdapterContentSection(Section):
 
     Attributes:
         title (str): The title of the section.
-        data (List): The primary data content for the section, to be saved in a report file.
+        text (str): The primary data content for the section, to be saved in a report file.
         flag (str): A status or quality flag associated with this section.
         output_folder (str): The path to the root folder for 
             storing report file, flag file and generated plots.
 
     Methods:
         plot_section(): Generates a line plot to show the adapter content across positions
+        draw(ax): Draws the same line plot with matplotlib only
     """
+    __slots__ = ()
+
+    def draw(self, ax):
+        x, labels = category_axis(self.table.column('#Position'))
+        for adapter in self.table.names[1:]:
+            ax.plot(x, self.table.column(adapter), marker='o', label=adapter)
+        set_category_ticks(ax, labels, max_ticks=40)
+        ax.legend(title='Adapter Type')
+        ax.set_title('Adapter Content Across Positions')
+        ax.set_xlabel('Position')
+        ax.set_ylabel('Adapter Content')
+        ax.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.7)
+
     def plot_section(self):
-        # Load the data from a text file, assuming it's tab-separated
-        file_path = os.path.join(self.output_folder, self.title, 'report.txt')
-        try:
-            data = pd.read_csv(file_path, sep='\t')
-        except FileNotFoundError:
-            print(f"Error: The file '{file_path}' was not found.")
-            sys.exit(1)
-        except pd.errors.EmptyDataError:
-            print(f"Error: The file '{file_path}' is empty.")
-            sys.exit(1)
-        except pd.errors.ParserError:
-            print(f"Error: The file '{file_path}' could not be parsed. Please check the file format.")
-            sys.exit(1)
+        if self.style.fast:
+            self.plot_fast('adapter_content_plot.png', (14, 8))
+            return
+        import seaborn as sns
+
+        data = self.table.frame
         # Melt the data for easier plotting with seaborn
         data_melted = data.melt(id_vars=['#Position'], var_name='Adapter Type', value_name='Content')
         # Create the plot
@@ -50,7 +55,7 @@ class AdapterContentSection(Section):
             print(f"ValueError while creating plot: {ve}. Please check the data values.")
             sys.exit(1)
         except TypeError as te:
-            print(f"TypeError while creating plot: {te}. Verify data types in the 'report.txt' file.")
+            print(f"TypeError while creating plot: {te}. Verify data types in the section data.")
             sys.exit(1)
         # Add titles and labels
         plt.title('Adapter Content Across Positions')
@@ -58,22 +63,5 @@ class AdapterContentSection(Section):
         plt.ylabel('Adapter Content')
         # Enable grid lines for better readability
         plt.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.7)
-        # Ensure the output folder exists
-        plot_folder = os.path.join(self.output_folder, self.title)
-        os.makedirs(plot_folder, exist_ok=True)
-        # Define the path to save the plot
-        output_path = os.path.join(plot_folder, 'adapter_content_plot.png')
         # Save the plot
-        try:
-            plt.savefig(output_path)
-        except PermissionError:
-            print(f"PermissionError: Insufficient permissions to save the plot to '{output_path}'.")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"FileNotFoundError: The path '{output_path}' is invalid. Please verify the output folder structure.")
-            sys.exit(1)
-        except IOError as ioe:
-            print(f"IOError: Could not save the plot to '{output_path}': {ioe}")
-            sys.exit(1)
-        plt.close()  # Close the plot to free memory
-        print(f"Plot saved to {output_path}")
+        self.save_plot('adapter_content_plot.png')
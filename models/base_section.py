@@ -1,7 +1,12 @@
 """Base model to manage each section of the fastqc files"""
 # David Oluwasusi 6th November 2024
 
+import io
 import os
+import sys
+from models.output_writer import DIRECT_WRITER
+from models.plot_style import DEFAULT_STYLE
+from models.profiler import NULL_PROFILER
 
 class Section:
     """
@@ -10,33 +15,48 @@ class Section:
 
     Attributes:
         title (str): The title of the section, used for naming folders and files.
-        data (List): The main data content of the section, which will be saved in a report.
+        text (str): The main data content of the section, which will be saved in a report.
+            Kept as one string, `data` gives it back as a list of lines.
         flag (str): A flag associated with the section, saved separately.
         output_folder (str): The root folder where reports and plots are saved.
+        table (SectionTable): The parsed typed columns of the section, shared with
+            the plotter. None for sections without a plot.
+        profiler (StageProfiler): Records the timing of the report/flag writes and
+            PNG encoding, a disabled profiler unless --profile is passed.
+        writer (OutputWriter): Writes the report, flag and plot files, shared by the
+            sections of a parser. Files are written immediately when not given.
+        style (PlotStyle): The plotting backend, resolution and PNG compression of the plots.
     """
-    def __init__(self, title, data, flag, output_folder):
+    __slots__ = ('title', 'text', 'flag', 'output_folder', 'table', 'profiler', 'writer', 'style')
+
+    def __init__(self, title, data, flag, output_folder, table=None, profiler=None, writer=None, style=None):
         self.title = title
-        self.data = data
+        self.text = data if isinstance(data, str) else "".join(data)
         self.flag = flag
         self.output_folder = output_folder
+        self.table = table
+        self.profiler = profiler or NULL_PROFILER
+        self.writer = writer or DIRECT_WRITER
+        self.style = style or DEFAULT_STYLE
+
+    @property
+    def data(self):
+        """The lines of the section, rebuilt from its text on demand"""
+        return self.text.splitlines(keepends=True)
 
     def write_report(self):
         """
             Writes the section data to a text file in the specified output folder.
         """
 
-        # Define the report directory and file path
+        # Define the report directory
         report_dir = os.path.join(self.output_folder, self.title)
-        report_path = os.path.join(report_dir, 'report.txt')
 
         try:
-            # Check if the directory exists; if not, create it
-            os.makedirs(report_dir, exist_ok=True)
-            # Write data content to the report file
-            data_content = "".join(self.data)
-            with open(report_path, 'w', encoding="utf-8") as f:
-                f.write(data_content)
-            print("Report successfully written to", report_path)
+            # Write data content to the report file, the writer creates the directory
+            data_content = self.text
+            self.writer.write(report_dir, 'report.txt', data_content,
+                              message="Report successfully written to", stage=(self.profiler, "report", self.title))
 
         except IOError as e:
             print(f"Error with file I/O: {e}")
@@ -50,18 +70,14 @@ class Section:
     def write_flag(self):
         """Write the flag of the test on the section to a flag.txt file
         """
-        # Define the flag directory and file path
+        # Define the flag directory
         flag_dir = os.path.join(self.output_folder, self.title)
-        flag_path = os.path.join(flag_dir, 'flag.txt')
 
         try:
-            # Check if the directory exists; if not, create it
-            os.makedirs(flag_dir, exist_ok=True)
-            # Write flag content to the flag file
+            # Write flag content to the flag file, the writer creates the directory
             flag_content = self.flag
-            with open(flag_path, 'w') as f:
-                f.write(flag_content)
-            print("Flag successfully written to", flag_path)
+            self.writer.write(flag_dir, 'flag.txt', flag_content,
+                              message="Flag successfully written to", stage=(self.profiler, "flag", self.title))
 
         except OSError as e:
             print(f"Error creating directory or writing file: {e}")
@@ -74,3 +90,63 @@ class Section:
         """To be implemented by each section on its own
         """
         pass
+
+    def draw(self, ax):
+        """Draws the plot of the section on a matplotlib axes with plain matplotlib calls,
+        to be implemented by each plotted section
+        """
+        pass
+
+    def plot_fast(self, file_name, figsize):
+        """
+        Plots the section with the fast backend: one figure drawn by `draw`, then saved.
+
+        Args:
+            file_name (str): name of the image file, e.g. 'adapter_content_plot.png'.
+            figsize (tuple): size of the figure in inches, the one of the seaborn plot.
+        """
+        if type(self).draw is Section.draw:
+            print(f"The section '{self.title}' has no plot, skipping {file_name}.")
+            return
+        import matplotlib.pyplot as plt
+
+        _, ax = plt.subplots(figsize=figsize)
+        try:
+            self.draw(ax)
+        except (ValueError, TypeError) as e:
+            plt.close()
+            print(f"{type(e).__name__} while creating plot: {e}. Please check the data values.")
+            sys.exit(1)
+        self.save_plot(file_name)
+
+    def save_plot(self, file_name, **savefig_kwargs):
+        """
+        Encodes the current matplotlib figure, hands the image to the output writer
+        for the section folder and closes the figure.
+
+        Args:
+            file_name (str): name of the image file, e.g. 'adapter_content_plot.png'.
+            **savefig_kwargs: extra arguments passed to `plt.savefig`.
+        """
+        import matplotlib.pyplot as plt
+
+        plot_folder = os.path.join(self.output_folder, self.title)
+        output_path = os.path.join(plot_folder, file_name)
+        image = io.BytesIO()
+        image_format = os.path.splitext(file_name)[1][1:] or 'png'
+        try:
+            with self.profiler.stage("encode", self.title):
+                plt.savefig(image, format=image_format,
+                            **{**self.style.savefig_kwargs(image_format), **savefig_kwargs})
+            self.writer.write(plot_folder, file_name, image.getvalue(), message="Plot saved to")
+        except PermissionError:
+            print(f"PermissionError: Insufficient permissions to save the plot to '{output_path}'.")
+            sys.exit(1)
+        except FileNotFoundError:
+            print(f"FileNotFoundError: The path '{output_path}' is invalid. Please verify the output folder structure.")
+            sys.exit(1)
+        except IOError as ioe:
+            print(f"IOError: Could not save the plot to '{output_path}': {ioe}")
+            sys.exit(1)
+        finally:
+            plt.close()  # Close the plot to free memory
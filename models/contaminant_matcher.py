@@ -0,0 +1,178 @@
+"""Matches overrepresented sequences against a local adapter/contaminant library"""
+# David Oluwasusi 6th November 2024
+
+import functools
+import hashlib
+import os
+import sys
+from collections import namedtuple
+
+DEFAULT_SEED_LENGTH = 20
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+
+class ContaminantMatch(namedtuple("ContaminantMatch", ("name", "strand", "identity", "overlap"))):
+    """Best library hit of a sequence: name, strand ('+' or '-'), identity (%) and overlap (bp)"""
+    __slots__ = ()
+
+    def __str__(self):
+        # the way FastQC writes its Possible Source column
+        return f"{self.name} ({self.identity:.0f}% over {self.overlap}bp)"
+
+
+def reverse_complement(sequence):
+    """Reverse complement of a DNA sequence, e.g. 'AACG' -> 'CGTT'"""
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def read_contaminants(path):
+    """
+    Reads a contaminant library, either a FASTA file or a FastQC contaminant/adapter
+    list (one 'name<TAB>sequence' line per entry, '#' comments).
+
+    Args:
+        path (str): the library file.
+
+    Returns:
+        List[tuple]: (name, upper case sequence) of each entry.
+    """
+    entries = []
+    with open(path, 'r', encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    if any(line.startswith(">") for line in lines):
+        name = None
+        parts = []
+        for line in lines + [">"]:
+            if line.startswith(">"):
+                if name is not None and parts:
+                    entries.append((name, "".join(parts).upper()))
+                name, parts = line[1:].strip(), []
+            elif line and name is not None:
+                parts.append(line)
+    else:
+        for line in lines:
+            if not line or line.startswith("#"):
+                continue
+            # FastQC lists separate the name and the sequence with one or more tabs
+            name, _, sequence = line.rpartition("\t")
+            if name.strip() and sequence:
+                entries.append((name.strip(), sequence.upper()))
+    return entries
+
+
+class ContaminantMatcher:
+    """
+    Seed index of a contaminant library and both strands of its sequences: every
+    `seed_length` window of a library sequence is a key of one hash table, so a query
+    is matched in a single pass over its own windows, and only the library entries
+    sharing a seed with it are aligned (ungapped, on the diagonal of the seed).
+    Results are kept per sequence, identical sequences of many samples are matched once.
+
+    Attributes:
+        entries (List[tuple]): (name, strand, sequence) of both strands of each library entry.
+        seed_length (int): length of the index windows, shorter library entries are indexed whole.
+        min_overlap (int): shortest aligned overlap reported as a hit, library entries
+            shorter than it are hits when they align over their whole length.
+        matches (dict): sequence -> ContaminantMatch or None, of every sequence matched so far.
+        source (str): the library file, for messages.
+    """
+    def __init__(self, contaminants, seed_length=DEFAULT_SEED_LENGTH, min_overlap=None, source=""):
+        self.seed_length = seed_length
+        self.min_overlap = seed_length if min_overlap is None else min_overlap
+        self.source = source
+        self.entries = []
+        self.matches = {}
+        self._index = {}
+        self._seed_lengths = set()
+        for name, sequence in contaminants:
+            self._add(name, "+", sequence)
+            reverse = reverse_complement(sequence)
+            if reverse != sequence:
+                self._add(name, "-", reverse)
+
+    def _add(self, name, strand, sequence):
+        number = len(self.entries)
+        self.entries.append((name, strand, sequence))
+        length = min(self.seed_length, len(sequence))
+        self._seed_lengths.add(length)
+        for offset in range(len(sequence) - length + 1):
+            self._index.setdefault(sequence[offset:offset + length], []).append((number, offset))
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Builds the matcher of a library file, exits when it cannot be read or is empty"""
+        try:
+            contaminants = read_contaminants(path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error: The contaminant library '{path}' could not be read ({e}).")
+            sys.exit(1)
+        if not contaminants:
+            print(f"Error: The contaminant library '{path}' has no sequences.")
+            sys.exit(1)
+        return cls(contaminants, source=path, **kwargs)
+
+    @property
+    def fingerprint(self):
+        """Hash of the library and matching settings, outputs made with another library are stale"""
+        digest = hashlib.sha256(f"{self.seed_length}:{self.min_overlap}".encode("utf-8"))
+        for name, strand, sequence in self.entries:
+            digest.update(f"\0{name}\t{strand}\t{sequence}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def match(self, sequence):
+        """
+        Best hit of a sequence in the library: the most matching bases over the
+        ungapped overlap of a seeded entry, then the highest identity.
+
+        Returns:
+            ContaminantMatch: the hit, or None when no entry overlaps the sequence
+                by at least min_overlap bases (or by its whole length when shorter).
+        """
+        if sequence in self.matches:
+            return self.matches[sequence]
+        query = sequence.upper()
+        diagonals = set()
+        for length in self._seed_lengths:
+            for position in range(len(query) - length + 1):
+                for number, offset in self._index.get(query[position:position + length], ()):
+                    diagonals.add((number, position - offset))
+
+        best = None
+        best_score = None
+        for number, shift in diagonals:
+            name, strand, library_sequence = self.entries[number]
+            start = max(0, shift)
+            end = min(len(query), shift + len(library_sequence))
+            overlap = end - start
+            if overlap < min(self.min_overlap, len(library_sequence)):
+                continue
+            same = sum(a == b for a, b in zip(query[start:end], library_sequence[start - shift:end - shift]))
+            score = (same, same / overlap, -number)
+            if best_score is None or score > best_score:
+                best_score = score
+                best = ContaminantMatch(name, strand, 100.0 * same / overlap, overlap)
+        self.matches[sequence] = best
+        return best
+
+    def annotate(self, sequences):
+        """Best hit of each sequence, see match"""
+        return [self.match(sequence) for sequence in sequences]
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_matcher(path, stamp):
+    return ContaminantMatcher.from_file(path)
+
+
+def load_matcher(path):
+    """
+    The matcher of a library file, built once per process and rebuilt when the file
+    changes, so the samples of a watch worker share it.
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        print(f"Error: The contaminant library '{path}' could not be read ({e}).")
+        sys.exit(1)
+    return _cached_matcher(path, (stat.st_size, stat.st_mtime_ns))
@@ -0,0 +1,59 @@
+"""Per sample dashboard: every section plot drawn as a subplot of one figure, encoded once"""
+# David Oluwasusi 6th November 2024
+
+import io
+import math
+
+DASHBOARD_FORMATS = ("png", "svg")
+DASHBOARD_COLUMNS = 3
+# Size of one subplot, in inches
+PANEL_SIZE = (6.4, 4.4)
+STATUS_COLORS = {"pass": "#2e7d32", "warn": "#ef6c00", "fail": "#c62828"}
+# Shared style of the panels, smaller text than the full size plots
+DASHBOARD_RC = {
+    "font.size": 8,
+    "axes.titlesize": 9,
+    "axes.labelsize": 8,
+    "xtick.labelsize": 7,
+    "ytick.labelsize": 7,
+    "legend.fontsize": 6,
+    "legend.title_fontsize": 7,
+    "lines.markersize": 2.5,
+    "lines.linewidth": 1.0,
+}
+
+
+def render_dashboard(sections, image_format="png", title=None):
+    """
+    Draws the plot of each section (see Section.draw) as a panel of one figure, titled
+    with its section title and coloured by its status, and encodes the figure once.
+
+    Args:
+        sections (List[Section]): the plotted sections, drawn in order, row by row.
+        image_format (str): 'png' or 'svg'.
+        title (str, optional): title of the figure, e.g. the file name of the sample.
+
+    Returns:
+        bytes: the encoded image.
+    """
+    import matplotlib.pyplot as plt
+
+    columns = min(DASHBOARD_COLUMNS, len(sections)) or 1
+    rows = math.ceil(len(sections) / columns) or 1
+    with plt.rc_context(DASHBOARD_RC):
+        fig = plt.figure(figsize=(PANEL_SIZE[0] * columns, PANEL_SIZE[1] * rows))
+        try:
+            for number, section in enumerate(sections, start=1):
+                ax = fig.add_subplot(rows, columns, number)
+                section.draw(ax)
+                ax.set_title(f"{section.title} ({section.flag})", color=STATUS_COLORS.get(section.flag, "black"))
+            if title:
+                fig.suptitle(title, fontsize=12)
+            # room for the figure title above the panels
+            fig.tight_layout(rect=(0, 0, 1, 1 - 0.3 / fig.get_figheight() if title else 1))
+            image = io.BytesIO()
+            style = sections[0].style if sections else None
+            fig.savefig(image, format=image_format, **(style.savefig_kwargs(image_format) if style else {}))
+        finally:
+            plt.close(fig)
+    return image.getvalue()
@@ -1,10 +1,129 @@
 """Module providing a class for processing fastqc files."""
 # David Oluwasusi 6th November 2024
 
-import re
+import contextlib
+import functools
+import gzip
+import io
+import mmap
+import os
 import sys
+import zipfile
 import constants as sections
 import models as se
+from models.output_manifest import OutputManifest
+from models.output_writer import OutputWriter
+from models.plot_style import DEFAULT_STYLE
+from models.profiler import NULL_PROFILER
+from models.section_index import SectionIndex
+
+END_MODULE = ">>END_MODULE"
+STATUSES = ("pass", "fail", "warn")
+# Name of the data file inside a FastQC zip archive (<sample>_fastqc/fastqc_data.txt)
+ARCHIVE_MEMBER = "fastqc_data.txt"
+# Input path reading the fastqc data from standard input
+STDIN_PATH = "-"
+
+# Getter processing each section title
+SECTION_GETTERS = {
+    sections.BASIC_STATS: "get_base",
+    sections.PER_TILE_SEQ: "get_tile_seq",
+    sections.PER_SEQ_QUALITY_SCORES: "get_seq_qual_scores",
+    sections.PER_BASE_SEQ_CONTENT: "get_base_seq_content",
+    sections.PER_SEQ_GC_CONTENT: "get_seq_gc_content",
+    sections.PER_BASE_N_CONTENT: "get_base_n_content",
+    sections.SEQ_LEN_DIST: "get_seq_len_dist",
+    sections.SEQ_DUPLICATION_LEVEL: "get_seq_dup",
+    sections.OVERREPRESENTED_SEQ: "get_overep_seq",
+    sections.ADAPTER_CONTENT: "get_adap_cont",
+    sections.KMER_CONTENT: "get_kmer_cont",
+}
+# Model plotting each section with a plot
+PLOT_MODELS = {
+    sections.PER_TILE_SEQ: "PerTileSeqSection",
+    sections.PER_SEQ_QUALITY_SCORES: "PerSeqQualSection",
+    sections.PER_BASE_SEQ_CONTENT: "PerBaseSeqContentSection",
+    sections.PER_SEQ_GC_CONTENT: "PerSeqGCContentSection",
+    sections.PER_BASE_N_CONTENT: "PerBaseNContentSection",
+    sections.SEQ_DUPLICATION_LEVEL: "SeqDuplicationLevelSection",
+    sections.ADAPTER_CONTENT: "AdapterContentSection",
+    sections.KMER_CONTENT: "KmerContentSection",
+}
+
+
+def is_archive(file_path):
+    """True for the compressed inputs read by open_fastqc_text: `*.zip` and `*.gz`"""
+    return file_path.endswith((".zip", ".gz"))
+
+
+@contextlib.contextmanager
+def open_fastqc_text(file_path):
+    """
+    Opens the text of a fastqc file for streaming, without extracting it to disk:
+    a plain fastqc_data.txt, a gzip compressed `fastqc_data.txt.gz`, a FastQC
+    `<sample>_fastqc.zip` archive, whose fastqc_data.txt member is decompressed as it is read,
+    or standard input when the path is '-'.
+
+    Args:
+        file_path (str): path of the fastqc file or archive.
+
+    Yields:
+        TextIO: the lines of the fastqc data.
+    """
+    if file_path == STDIN_PATH:
+        # decoded as UTF-8 whatever the locale, stdin itself is left open
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        try:
+            yield stream
+        finally:
+            stream.detach()
+    elif file_path.endswith(".gz"):
+        with gzip.open(file_path, 'rt', encoding="utf-8") as f:
+            yield f
+    elif file_path.endswith(".zip"):
+        with zipfile.ZipFile(file_path) as archive:
+            members = [name for name in archive.namelist()
+                       if os.path.basename(name) == ARCHIVE_MEMBER]
+            if not members:
+                print(f"Error: '{file_path}' does not contain a {ARCHIVE_MEMBER} file.")
+                sys.exit(1)
+            # the shallowest match is the report itself, not a nested copy
+            member = min(members, key=lambda name: name.count("/"))
+            with archive.open(member) as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+                yield f
+    else:
+        with open(file_path, 'r', encoding="utf-8") as f:
+            yield f
+
+
+def _init_plot_worker():
+    """Gives each plotting worker process its own non interactive Agg backend"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render_section(section, options):
+    """
+    Plots a section in a worker process.
+
+    Args:
+        section (Section): the section to plot.
+        options (dict): keyword arguments for its plot_section.
+
+    Returns:
+        tuple: (captured console output, exit code if the plotter called sys.exit else None,
+            profiler records of the plot to merge into the parent's profiler,
+            files kept in memory by a MemoryWriter to hand back to the parent's writer)
+    """
+    log = io.StringIO()
+    profiler = section.profiler
+    with contextlib.redirect_stdout(log):
+        try:
+            with profiler.stage("plot", section.title):
+                section.plot_section(**options)
+        except SystemExit as e:
+            return log.getvalue(), e.code, profiler.records, getattr(section.writer, "files", {})
+    return log.getvalue(), None, profiler.records, getattr(section.writer, "files", {})
 
 class FastQCParser:
     """
@@ -23,20 +142,64 @@ class FastQCParser:
 
     """
 
-    def __init__(self, file_path, output_folder):
+    def __init__(self, file_path, output_folder, use_index=True, write_reports=True, jobs=1,
+                 plot_options=None, incremental=False, force=False, profiler=None, writer=None,
+                 contaminants=None, plot_style=None, plots=True):
         """
         Constructs all the necessary attributes for the parser object.
 
         Parameters
         ----------
             file_path : str
-                the file path to read the fastqc file
+                the file path to read the fastqc file, a `_fastqc.zip` / `.gz` archive of it,
+                a RunCache folder, or '-' for standard input
             output_folder : str
                 the folder to write the results to
+            use_index : bool
+                read sections through the persistent byte-offset index (see SectionIndex),
+                archives are always streamed
+            write_reports : bool
+                write the report.txt of each section, plots and flags are produced either way
+            jobs : int
+                number of worker processes rendering plots when several sections are processed
+            plot_options : dict
+                section title -> keyword arguments passed to that section's plot_section
+            incremental : bool
+                skip sections whose outputs are already up to date (see OutputManifest)
+            force : bool
+                with incremental, regenerate every section but still update the manifest
+            profiler : StageProfiler
+                records the timing and memory of each stage, disabled when not given
+            writer : OutputWriter
+                writes the output files, a writer writing each file immediately when not given.
+                get_sections waits for a background writer before returning
+            contaminants : ContaminantMatcher
+                library the overrepresented sequences are matched against, written to
+                their sources.tsv, no matching when not given
+            plot_style : PlotStyle
+                plotting backend, resolution and PNG compression of the plots, the seaborn
+                charts at matplotlib's defaults when not given
+            plots : bool
+                draw the plots, flags and reports are produced either way
         """
         self.fastqc_dict = {}
         self.output_folder = output_folder
         self.file_path = file_path
+        self.use_index = use_index
+        self.write_reports = write_reports
+        self.jobs = jobs
+        self.plot_options = plot_options or {}
+        self.incremental = incremental
+        self.force = force
+        self.profiler = profiler or NULL_PROFILER
+        self.writer = writer or OutputWriter(background=False)
+        self.contaminants = contaminants
+        self.plot_style = plot_style or DEFAULT_STYLE
+        self.plots = plots
+        self._executor = None
+        self._pending = []
+        # sections already processed by get_sections in this run
+        self._handled = set()
 
     @staticmethod
     def print_summary(summary):
@@ -44,218 +207,526 @@ class FastQCParser:
         Prints a provided summary.
 
         Args:
-            summary (List): A summary list of strings to print.
+            summary (str | List): The summary text, or a list of its lines, to print.
         """
         print(">>Basic Statistics")
         print("")
         print("".join(summary))
         print(">>END_MODULE")
 
-    def parse_fastqc_to_dictionary(self):
+    def parse_fastqc_to_dictionary(self, requested=None):
         """converts fastqc file to a dictionary where the key is the title of the section.
         The value is a dictionary containing section_content, status
 
+        Args:
+            requested (Iterable[str], optional): titles (from constants.py) of the sections
+                to keep. Bodies of other sections are skipped without being stored and
+                reading stops once the last requested section is closed.
+                Defaults to None, which keeps every section.
+
         Returns:
             Dictionary: {
-                "section_content": list of each line in the section
+                "section_content": the text of the section, as one string
                 "status": string (pass | fail | warn) which represents the result of the section
             }
         """
         try:
-            # comment:
-            with open(self.file_path, 'r',  encoding="utf-8") as f:
-                parsed_dict = {}
-                end_pattern = r'.*>>END_MODULE$'
-                section_title = r'>>\s*(.*?)\s+(pass|fail|warn)$'
-                current_section = None
-                current_status = None
-                section_content = []
-                for line in f:
-                    if line.startswith(">>") and not re.match(end_pattern, line) :
-                        # Save the previous section if any
-                        if current_section:
-                            parsed_dict[current_section] = {
-                                "section_content": section_content, 
-                                "status": current_status
-                                }
-                            section_content = []
-
-                        #extract section title
-                        match = re.search(section_title, line)
-                        if match:
-                            current_section = match.group(1).strip()
-                            current_status = match.group(2).strip()
-                    elif re.match(end_pattern, line) and current_section:
-                        # Reached end of a section, save it and reset the pointers to None
-                        parsed_dict[current_section] = {
-                            "section_content": section_content, 
-                            "status": current_status
-                            }
-                        current_section = None
-                        current_status = None
-                        section_content = []
-
-                    elif current_section:
-                        section_content.append(line)
-
-                if current_section:
-                    parsed_dict[current_section] = {
-                        "section_content": section_content, 
-                        "status": current_status
-                        }
-
-            self.fastqc_dict = parsed_dict
+            with self.profiler.stage("parse"):
+                if self.file_path == STDIN_PATH:
+                    with open_fastqc_text(self.file_path) as f:
+                        self.fastqc_dict = FastQCParser.parse_sections(f, requested)
+                elif os.path.isdir(self.file_path):
+                    self.fastqc_dict = self.load_cache(requested)
+                elif (self.use_index and not is_archive(self.file_path)
+                        and os.path.getsize(self.file_path) > 0):
+                    self.fastqc_dict = self.parse_indexed_sections(requested)
+                else:
+                    with open_fastqc_text(self.file_path) as f:
+                        self.fastqc_dict = FastQCParser.parse_sections(f, requested)
             return self.fastqc_dict
 
         except FileNotFoundError:
             print("passed path", self.file_path, "does not exist")
             sys.exit(1)
+        except (zipfile.BadZipFile, gzip.BadGzipFile, EOFError) as e:
+            print(f"Error: the archive '{self.file_path}' could not be read ({e}).")
+            sys.exit(1)
+
+    @classmethod
+    def from_cache(cls, cache_path, output_folder, requested=None, **kwargs):
+        """Creates a parser whose sections are loaded from a RunCache folder instead of parsed.
+
+        Args:
+            cache_path (str): the folder written by save_cache.
+            output_folder (str): the folder to write the results to.
+            requested (Iterable[str], optional): titles of the sections to load, None loads all.
+            **kwargs: other FastQCParser options.
+        """
+        parser = cls(cache_path, output_folder, **kwargs)
+        parser.parse_fastqc_to_dictionary(requested)
+        return parser
+
+    def load_cache(self, requested=None):
+        """Loads the sections, with their typed tables memory mapped, from the RunCache
+        folder at file_path.
+
+        Returns:
+            Dictionary: section title -> {"section_content": str, "status": str, "table": SectionTable}
+        """
+        from models.run_cache import RunCache
+
+        if not RunCache.is_cache(self.file_path):
+            print(f"Error: '{self.file_path}' is a folder but not a run cache.")
+            sys.exit(1)
+        try:
+            return RunCache.load(self.file_path, requested).fastqc_dict
+        except (OSError, ValueError) as e:
+            print(f"Error: the run cache '{self.file_path}' could not be read ({e}).")
+            sys.exit(1)
+
+    def save_cache(self, cache_path):
+        """Writes every parsed section, with the typed table of each, to a RunCache folder
+        that later runs and other tools can load without parsing text.
+
+        Args:
+            cache_path (str): the folder to write the cache to.
+        """
+        from models.run_cache import RunCache
+
+        for title, entry in self.fastqc_dict.items():
+            if entry.get("table") is None:
+                try:
+                    entry["table"] = se.SectionTable(title, entry["section_content"])
+                except ValueError:
+                    # kept as text only, its table is reported when a plot needs it
+                    entry["table"] = None
+        if os.path.isdir(self.file_path):
+            cache = RunCache(cache_path, RunCache.load(self.file_path, ()).source, self.fastqc_dict)
+        else:
+            cache = RunCache.from_file(cache_path, self.file_path, self.fastqc_dict)
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"Error writing the run cache to '{cache_path}': {e}")
+            sys.exit(1)
+        print("Run cache written to", cache_path)
+
+    def parse_indexed_sections(self, requested=None):
+        """Memory maps the fastqc file and slices out the requested sections
+        using its sidecar SectionIndex, so only those sections are decoded.
+
+        Args:
+            requested (Iterable[str], optional): titles of the sections to keep,
+                None keeps every section.
+
+        Returns:
+            Dictionary: section title -> {"section_content": str, "status": str}
+        """
+        parsed_dict = {}
+        with open(self.file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            index = SectionIndex.for_file(self.file_path, buffer)
+            for title, (start, end, status) in index.sections.items():
+                if requested is not None and title not in requested:
+                    continue
+                text = buffer[start:end].decode("utf-8")
+                if "\r" in text:
+                    text = text.replace("\r\n", "\n")
+                parsed_dict[title] = {
+                    "section_content": text,
+                    "status": status
+                    }
+        return parsed_dict
+
+    @staticmethod
+    def parse_sections(lines, requested=None):
+        """Single pass over the lines of a fastqc file, dispatching on the `>>` prefix.
+
+        Args:
+            lines (Iterable[str]): lines of the fastqc file, e.g. an open file object.
+            requested (Iterable[str], optional): titles of the sections to keep,
+                None keeps every section.
+
+        Returns:
+            Dictionary: section title -> {"section_content": str, "status": str}
+        """
+        parsed_dict = {}
+        for title, status, content in FastQCParser.iter_sections(lines, requested):
+            parsed_dict[title] = {
+                "section_content": content,
+                "status": status
+                }
+        return parsed_dict
+
+    @staticmethod
+    def iter_sections(lines, requested=None):
+        """Generator behind parse_sections, yielding each section as soon as it is closed,
+        so a stream such as stdin can be processed with only one section in memory.
+
+        Args:
+            lines (Iterable[str]): lines of the fastqc file, e.g. an open file object.
+            requested (Iterable[str], optional): titles of the sections to yield,
+                None yields every section. Reading stops after the last requested one.
+
+        Yields:
+            tuple: (title, status, section content as one string)
+        """
+        remaining = None if requested is None else set(requested)
+        if remaining is not None and not remaining:
+            return
+
+        current_section = None
+        current_status = None
+        # None while inside a section that was not requested
+        section_content = None
+        for line in lines:
+            if not line.startswith(">>"):
+                if section_content is not None:
+                    section_content.append(line)
+                continue
+
+            if section_content is not None:
+                # Close the current section, either on its END_MODULE or on a new header
+                yield current_section, current_status, "".join(section_content)
+                section_content = None
+                if remaining is not None:
+                    remaining.discard(current_section)
+                    if not remaining:
+                        break
+
+            if line.startswith(END_MODULE):
+                current_section = None
+                current_status = None
+                continue
+
+            #extract section title and status from ">>Title<TAB>status"
+            header = line[2:].split()
+            if len(header) < 2 or header[-1] not in STATUSES:
+                current_section = None
+                current_status = None
+                continue
+            current_section = " ".join(header[:-1])
+            current_status = header[-1]
+            if remaining is None or current_section in remaining:
+                section_content = []
+
+        if section_content is not None:
+            yield current_section, current_status, "".join(section_content)
+
+    def apply_limits(self, limits):
+        """Replaces the status FastQC gave each parsed section by the one recomputed
+        from its table against the limits, before any flag is written.
+
+        Args:
+            limits (QCLimits): the thresholds, e.g. from a lab specific limits.txt.
+
+        Returns:
+            dict: title -> (FastQC status, new status) of the sections whose status changed.
+        """
+        from models.qc_limits import CHECKS, evaluate
+
+        tables = {title: [self.section_table(title)] for title in CHECKS if title in self.fastqc_dict}
+        changed = {}
+        for title, statuses in evaluate(limits, tables).items():
+            entry = self.fastqc_dict[title]
+            status = str(statuses[0])
+            if status and status != entry["status"]:
+                changed[title] = (entry["status"], status)
+                entry["status"] = status
+        return changed
+
+    def section_table(self, title):
+        """Builds the typed table of a parsed section once and caches it in fastqc_dict,
+        so the plotter and any other consumer share the same object.
+
+        Args:
+            title (str): title of the section.
+
+        Returns:
+            SectionTable: the parsed table of the section.
+        """
+        entry = self.fastqc_dict[title]
+        if entry.get("table") is None:
+            try:
+                entry["table"] = se.SectionTable(title, entry["section_content"])
+            except ValueError as ve:
+                print(f"Error: The section '{title}' could not be parsed ({ve}). Please check the file format.")
+                sys.exit(1)
+        return entry["table"]
+
+    def _make_section(self, title, section_class, with_table=True):
+        """Creates the model of a parsed section, with its shared table when it is plotted
+        """
+        entry = self.fastqc_dict[title]
+        table = None
+        if with_table:
+            table = self.section_table(title)
+            if table.is_empty:
+                print(f"Error: The section '{title}' is empty.")
+                sys.exit(1)
+        return section_class(
+            title=title,
+            data=entry["section_content"],
+            flag=entry["status"],
+            output_folder=self.output_folder,
+            table=table,
+            profiler=self.profiler,
+            writer=self.writer,
+            style=self.plot_style)
+
+    def plot_model(self, title):
+        """
+        The plotting model of a parsed section (see PLOT_MODELS), sharing the parsed
+        table, writer and plot style of the parser.
+
+        Args:
+            title (str): title of a plotted section present in fastqc_dict.
+        """
+        return self._make_section(title, getattr(se, PLOT_MODELS[title]))
 
     def get_base(self):
         """parses the base section
         """
-        title = sections.BASIC_STATS
-        data = self.fastqc_dict[sections.BASIC_STATS]["section_content"]
-        flag = self.fastqc_dict[sections.BASIC_STATS]["status"]
-        output = self.output_folder
-        section = se.Section(title=title, data=data, flag=flag, output_folder=output)
-        section.write_report()
+        section = self._make_section(sections.BASIC_STATS, se.Section, with_table=False)
+        if self.write_reports:
+            section.write_report()
         section.write_flag()
 
     def get_tile_seq(self):
         """parses the per tile sequence section
         """
-        title = sections.PER_TILE_SEQ
-        data = self.fastqc_dict[sections.PER_TILE_SEQ]["section_content"]
-        flag = self.fastqc_dict[sections.PER_TILE_SEQ]["status"]
-        output = self.output_folder
-        section = se.PerTileSeqSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.PER_TILE_SEQ, se.PerTileSeqSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_seq_qual_scores(self):
         """parses the per quality scores section
         """
-        title = sections.PER_SEQ_QUALITY_SCORES
-        data = self.fastqc_dict[sections.PER_SEQ_QUALITY_SCORES]["section_content"]
-        flag = self.fastqc_dict[sections.PER_SEQ_QUALITY_SCORES]["status"]
-        output = self.output_folder
-        section = se.PerSeqQualSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.PER_SEQ_QUALITY_SCORES, se.PerSeqQualSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_base_seq_content(self):
         """ parses the per base sequence content section
         """
-        title = sections.PER_BASE_SEQ_CONTENT
-        data = self.fastqc_dict[sections.PER_BASE_SEQ_CONTENT]["section_content"]
-        flag = self.fastqc_dict[sections.PER_BASE_SEQ_CONTENT]["status"]
-        output = self.output_folder
-        section = se.PerBaseSeqContentSection(
-            title=title,
-            data=data,
-            flag=flag,
-            output_folder=output)
+        section = self._make_section(sections.PER_BASE_SEQ_CONTENT, se.PerBaseSeqContentSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_seq_gc_content(self):
         """parses the per sequence gc content section
         """
-        title = sections.PER_SEQ_GC_CONTENT
-        data = self.fastqc_dict[sections.PER_SEQ_GC_CONTENT]["section_content"]
-        flag = self.fastqc_dict[sections.PER_SEQ_GC_CONTENT]["status"]
-        output = self.output_folder
-        section = se.PerSeqGCContentSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.PER_SEQ_GC_CONTENT, se.PerSeqGCContentSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_base_n_content(self):
         """parses the per base N content sections
         """
-        title = sections.PER_BASE_N_CONTENT
-        data = self.fastqc_dict[sections.PER_BASE_N_CONTENT]["section_content"]
-        flag = self.fastqc_dict[sections.PER_BASE_N_CONTENT]["status"]
-        output = self.output_folder
-        section = se.PerBaseNContentSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.PER_BASE_N_CONTENT, se.PerBaseNContentSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_seq_len_dist(self):
         """parses the sequence length list section"""
-        title = sections.SEQ_LEN_DIST
-        data = self.fastqc_dict[sections.SEQ_LEN_DIST]["section_content"]
-        flag = self.fastqc_dict[sections.SEQ_LEN_DIST]["status"]
-        output = self.output_folder
-         # using the base class here because we dont need to do any plots for this section
-        section = se.Section(title=title, data=data, flag=flag, output_folder=output)
+        # using the base class here because we dont need to do any plots for this section
+        section = self._make_section(sections.SEQ_LEN_DIST, se.Section, with_table=False)
         section.write_flag()
-        section.write_report()
+        if self.write_reports:
+            section.write_report()
 
     def get_seq_dup(self):
         """parses the sequence duplication level section
         """
-        title = sections.SEQ_DUPLICATION_LEVEL
-        data = self.fastqc_dict[sections.SEQ_DUPLICATION_LEVEL]["section_content"]
-        flag = self.fastqc_dict[sections.SEQ_DUPLICATION_LEVEL]["status"]
-        output = self.output_folder
-        section = se.SeqDuplicationLevelSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.SEQ_DUPLICATION_LEVEL, se.SeqDuplicationLevelSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_overep_seq(self):
         """parses the overrepresented sequence section
         """
-        title = sections.OVERREPRESENTED_SEQ
-        data = self.fastqc_dict[sections.OVERREPRESENTED_SEQ]["section_content"]
-        flag = self.fastqc_dict[sections.OVERREPRESENTED_SEQ]["status"]
-        output = self.output_folder
-        # using the base class here because we dont need to do any plots for this section
-        section = se.Section(title, data, flag, output_folder=output)
+        # no plots for this section, its sequences are matched when a contaminant library is given
+        section = self._make_section(sections.OVERREPRESENTED_SEQ, se.OverrepresentedSeqSection, with_table=False)
         section.write_flag()
-        section.write_report()
+        if self.write_reports:
+            section.write_report()
+        if self.contaminants is not None:
+            section.table = self.section_table(section.title)
+            section.write_sources(self.contaminants)
 
     def get_adap_cont(self):
         """parses the adapter content section
         """
-        title = sections.ADAPTER_CONTENT
-        data = self.fastqc_dict[sections.ADAPTER_CONTENT]["section_content"]
-        flag = self.fastqc_dict[sections.ADAPTER_CONTENT]["status"]
-        output = self.output_folder
-        section = se.AdapterContentSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.ADAPTER_CONTENT, se.AdapterContentSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
 
     def get_kmer_cont(self):
         """parses the kmer content section
         """
-        title = sections.KMER_CONTENT
-        data = self.fastqc_dict[sections.KMER_CONTENT]["section_content"]
-        flag = self.fastqc_dict[sections.KMER_CONTENT]["status"]
-        output = self.output_folder
-        section = se.KmerContentSection(title=title, data=data, flag=flag, output_folder=output)
+        section = self._make_section(sections.KMER_CONTENT, se.KmerContentSection)
         section.write_flag()
-        section.write_report()
-        section.plot_section()
+        if self.write_reports:
+            section.write_report()
+        self._plot(section)
+
+    def _plot(self, section):
+        """Plots a section now, or hands it to the worker pool while get_sections runs in parallel
+        """
+        if not self.plots:
+            return
+        options = self.plot_options.get(section.title, {})
+        if self._executor is None:
+            with self.profiler.stage("plot", section.title):
+                section.plot_section(**options)
+        else:
+            self._pending.append(self._executor.submit(_render_section, section, options))
+
+    def get_sections(self, titles):
+        """processes the given sections in order.
+        With more than one job the plots are rendered concurrently in worker processes,
+        while flags and reports are still written in order by this process and the
+        console output is printed in the same order as a sequential run.
+
+        When the parser is incremental, sections whose outputs in the output folder were
+        produced from the same content and settings (see OutputManifest) are skipped.
+
+        Args:
+            titles (Iterable[str]): titles of the sections to process (see SECTION_GETTERS).
+                Repeated titles and sections already processed in this run are left out.
+        """
+        titles = [title for title in dict.fromkeys(titles) if title not in self._handled]
+        self._handled.update(titles)
+        if not self.incremental:
+            self._run_getters([getattr(self, SECTION_GETTERS[title]) for title in titles])
+            return
+
+        manifest = OutputManifest.load(self.output_folder)
+        getters = []
+        changed = {}
+        for title in titles:
+            entry = self.fastqc_dict[title]
+            settings = {
+                "plot_options": self.plot_options.get(title, {}),
+                "write_reports": self.write_reports,
+            }
+            if self.plot_style.settings():
+                settings["plot_style"] = self.plot_style.settings()
+            if not self.plots:
+                settings["plots"] = False
+            if title == sections.OVERREPRESENTED_SEQ and self.contaminants is not None:
+                settings["contaminants"] = self.contaminants.fingerprint
+            section_hash = OutputManifest.section_hash(
+                title, entry["section_content"], entry["status"], settings)
+            if not self.force and (manifest.is_current(title, section_hash) or title in changed):
+                getters.append(functools.partial(print, f"Skipping {title}: unchanged since the last run"))
+            else:
+                getters.append(getattr(self, SECTION_GETTERS[title]))
+                changed[title] = section_hash
+        self._run_getters(getters)
+        # Only reached when every section was written, a failed run is redone in full
+        for title, section_hash in changed.items():
+            manifest.record(title, section_hash)
+        if changed:
+            manifest.save()
+
+    def _run_getters(self, getters):
+        """Runs section getters in order, rendering their plots in parallel when jobs > 1,
+        and waits until the writer has written every file
+        """
+        try:
+            self._run_getters_in_order(getters)
+        finally:
+            written = self.writer.flush()
+        if not written:
+            sys.exit(1)
+
+    def _run_getters_in_order(self, getters):
+        """Runs the getters in this process or with a plot worker pool, see _run_getters
+        """
+        if self.jobs <= 1 or len(getters) < 2:
+            for getter in getters:
+                getter()
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_plot_worker) as executor:
+            self._executor = executor
+            outputs = []
+            try:
+                for getter in getters:
+                    self._pending = []
+                    log = io.StringIO()
+                    try:
+                        with contextlib.redirect_stdout(log):
+                            getter()
+                    finally:
+                        outputs.append((log.getvalue(), self._pending))
+            finally:
+                self._executor = None
+                self._pending = []
+                # Print each section's writes followed by its plot output, in order
+                for text, futures in outputs:
+                    print(text, end="")
+                    for future in futures:
+                        plot_output, exit_code, records, files = future.result()
+                        self.profiler.extend(records)
+                        if files:
+                            self.writer.files.update(files)
+                        print(plot_output, end="")
+                        if exit_code is not None:
+                            sys.exit(exit_code)
+
+    def write_dashboard(self, titles=None, image_format="png"):
+        """writes the plots of the parsed sections as the panels of one figure,
+        dashboard.png or dashboard.svg in the output folder
+
+        Args:
+            titles (Iterable[str], optional): titles of the sections to draw, defaults to every
+                parsed section with a plot. Drawn in the order FastQC writes them.
+            image_format (str): 'png' or 'svg'.
+        """
+        from models.dashboard import render_dashboard
+
+        selected = [title for title in sections.ALL_SECTIONS if title in PLOT_MODELS
+                    and title in self.fastqc_dict and (titles is None or title in titles)]
+        panels = [self.plot_model(title) for title in selected]
+        summary = self.fastqc_dict.get(sections.BASIC_STATS)
+        name = None
+        if summary is not None:
+            table = self.section_table(sections.BASIC_STATS)
+            name = dict(zip(table.column(table.names[0]), table.column(table.names[1]))).get("Filename")
+        try:
+            with self.profiler.stage("dashboard"):
+                image = render_dashboard(panels, image_format, name)
+                path = self.writer.write(self.output_folder, f"dashboard.{image_format}", image)
+            written = self.writer.flush()
+        except (ValueError, TypeError) as e:
+            print(f"{type(e).__name__} while creating the dashboard: {e}. Please check the data values.")
+            sys.exit(1)
+        except OSError as e:
+            print(f"Error creating directory or writing file: {e}")
+            sys.exit(1)
+        if not written:
+            sys.exit(1)
+        self.writer.announce("Dashboard saved to", path)
 
     def get_all(self):
         """parses all sections
         """
-        self.get_base()
-        self.get_tile_seq()
-        self.get_seq_qual_scores()
-        self.get_base_seq_content()
-        self.get_seq_gc_content()
-        self.get_base_n_content()
-        self.get_seq_len_dist()
-        self.get_seq_dup()
-        self.get_overep_seq()
-        self.get_adap_cont()
-        self.get_kmer_cont()
+        self.get_sections(SECTION_GETTERS)
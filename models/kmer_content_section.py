@@ -1,13 +1,60 @@
 """Model to manage the kmer content section of the fastqc file, inherits from Section model"""
 # David Oluwasusi 6th November 2024
 
+import re
 import sys
-import os
-import pandas as pd
-import seaborn as sns
+import numpy as np
 import matplotlib.pyplot as plt
 from  models.base_section import Section
 
+# Metrics of the kmer table and whether their largest values are the notable ones
+KMER_METRICS = {
+    'Count': True,
+    'PValue': False,
+    'Obs/Exp Overall': True,
+    'Obs/Exp Max': True,
+}
+POSITION_COLUMN = 'Max Obs/Exp Position'
+
+
+def top_n_indices(values, n, largest=True):
+    """
+    Row indices of the n largest (or smallest) values, best first, without sorting the
+    whole column: np.partition finds the n-th value, then only the rows up to it are sorted.
+    Ties keep the row order, as DataFrame.nlargest does.
+
+    Args:
+        values (numpy.ndarray): the metric column.
+        n (int): number of rows to select.
+        largest (bool): select the largest values, else the smallest.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keys = -values if largest else values
+    # NaN rows are never selected before real values
+    keys = np.where(np.isnan(keys), np.inf, keys)
+    n = min(n, len(keys))
+    if n <= 0:
+        return np.array([], dtype=np.int64)
+    if n < len(keys):
+        # every row tied with the n-th value is kept so ties resolve by row order
+        threshold = np.partition(keys, n - 1)[n - 1]
+        candidates = np.flatnonzero(keys <= threshold)
+    else:
+        candidates = np.arange(len(keys))
+    order = np.lexsort((candidates, keys[candidates]))
+    return candidates[order][:n]
+
+
+def position_starts(labels):
+    """First position of each 'Max Obs/Exp Position' value, e.g. '10-14' -> 10"""
+    return np.array([int(str(label).split('-')[0]) for label in labels], dtype=np.int64)
+
+
+def metric_file_name(metric):
+    """Image name of a metric plot, e.g. 'Obs/Exp Max' -> 'kmer_content_by_obs_exp_max.png'"""
+    return f"kmer_content_by_{re.sub(r'[^0-9a-z]+', '_', metric.lower()).strip('_')}.png"
+
+
 class KmerContentSection(Section):
     """
     Represents the kmer content  section in the fastqc file.
@@ -17,33 +64,74 @@ class KmerContentSection(Section):
 
     Attributes:
         title (str): The title of the section.
-        data (List): The primary data content for the section, to be saved in a report file.
+        text (str): The primary data content for the section, to be saved in a report file.
         flag (str): A status or quality flag associated with this section.
-        output_folder (str): The path to the root folder for 
+        output_folder (str): The path to the root folder for
             storing report file, flag file and generated plots.
 
     Methods:
-        plot_section(): Generates a barplot of the top 20 kmer count
+        plot_section(): Generates a barplot of the top 20 kmer count, and optionally of
+                        other metrics and of the positions of the kmers
+        draw(ax): Draws the top 20 kmer count barplot with matplotlib only
     """
+    __slots__ = ()
 
-    def plot_section(self, metric='Count', top_n=20):
-        # Load the data from a text file, assuming it's tab-separated
-        file_path = os.path.join(self.output_folder, self.title, 'report.txt')
-        try:
-            data = pd.read_csv(file_path, sep='\t')
-        except FileNotFoundError:
-            print(f"Error: The file '{file_path}' was not found.")
-            sys.exit(1)
-        except pd.errors.EmptyDataError:
-            print(f"Error: The file '{file_path}' is empty.")
-            sys.exit(1)
-        except pd.errors.ParserError:
-            print(f"Error: The file '{file_path}' could not be parsed. Please check the file format.")
-            sys.exit(1)
-        # Remove any leading '#' from column names
-        data.columns = data.columns.str.replace('#', '')
-        # Sort by the specified metric and select the top N K-mers
-        data_top = data.nlargest(top_n, metric)
+    @property
+    def metrics(self):
+        """The metric columns present in this kmer table, FastQC versions differ"""
+        return [metric for metric in KMER_METRICS if metric in self.table.names]
+
+    def plot_section(self, metric='Count', top_n=20, metrics=None, positions=False):
+        """
+        Args:
+            metric (str): the metric of the bar plot when `metrics` is not given.
+            top_n (int): number of kmers in each bar plot and in the position heat summary.
+            metrics (List[str], optional): plot each of these metrics ('all' for every
+                metric of the table), all from the same parsed table.
+            positions (bool): also plot the distribution of the max Obs/Exp positions
+                and the position x kmer heat summary.
+        """
+        if metrics is None:
+            metrics = [metric]
+        elif metrics == 'all' or 'all' in metrics:
+            metrics = self.metrics
+        data = None
+        if not self.style.fast:
+            data = self.table.frame
+            # Remove any leading '#' from column names
+            data.columns = data.columns.str.replace('#', '')
+        for name in metrics:
+            if name not in self.table.names:
+                print(f"Error: The kmer table has no '{name}' column, it has {', '.join(self.metrics)}.")
+                sys.exit(1)
+            self._plot_metric(data, name, top_n)
+        if positions:
+            self._plot_position_distribution()
+            self._plot_position_heatmap(top_n)
+
+    def draw(self, ax, metric='Count', top_n=20):
+        rows = top_n_indices(self.table.column(metric), top_n, KMER_METRICS.get(metric, True))
+        # best kmer on top, as seaborn draws horizontal bars
+        ax.barh(np.arange(len(rows)), self.table.column(metric)[rows], color='skyblue')
+        ax.set_yticks(np.arange(len(rows)))
+        ax.set_yticklabels(self.table.column(self.table.names[0])[rows])
+        ax.invert_yaxis()
+        ax.set_title(f'Top {top_n} K-mer Sequences by {metric}')
+        ax.set_xlabel(metric)
+        ax.set_ylabel('K-mer Sequence')
+        ax.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.7)
+
+    def _plot_metric(self, data, metric, top_n):
+        if self.style.fast:
+            _, ax = plt.subplots(figsize=(14, 8))
+            self.draw(ax, metric, top_n)
+            self.save_plot(metric_file_name(metric), bbox_inches="tight")
+            return
+        import seaborn as sns
+
+        # Select the top N K-mers of the metric
+        rows = top_n_indices(self.table.column(metric), top_n, KMER_METRICS.get(metric, True))
+        data_top = data.iloc[rows]
         # Create the plot
         plt.figure(figsize=(14, 8))
         try:
@@ -52,7 +140,7 @@ class KmerContentSection(Section):
             print(f"ValueError while creating plot: {ve}. Please check the data values.")
             sys.exit(1)
         except TypeError as te:
-            print(f"TypeError while creating plot: {te}. Verify data types in the 'report.txt' file.")
+            print(f"TypeError while creating plot: {te}. Verify data types in the section data.")
             sys.exit(1)
         # Add titles and labels
         plt.title(f'Top {top_n} K-mer Sequences by {metric}')
@@ -60,24 +148,40 @@ class KmerContentSection(Section):
         plt.ylabel('K-mer Sequence')
         # Enable grid lines for better readability
         plt.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.7)
-        # Ensure the output folder exists
-        plot_folder = os.path.join(self.output_folder, self.title)
-        os.makedirs(plot_folder, exist_ok=True)
-        # Define the path to save the plot
-        output_path = os.path.join(plot_folder, f'kmer_content_by_{metric.lower()}.png')
         # Save the plot
-        try:
-            plt.savefig(output_path, bbox_inches="tight")
-            plt.close()  # Close the plot to free memory
-        except PermissionError:
-            print(f"PermissionError: Insufficient permissions to save the plot to '{output_path}'.")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"FileNotFoundError: The path '{output_path}' is invalid. Please verify the output folder structure.")
-            sys.exit(1)
-        except IOError as ioe:
-            print(f"IOError: Could not save the plot to '{output_path}': {ioe}")
-            sys.exit(1)
-        
-        print(f"Plot saved to {output_path}")
+        self.save_plot(metric_file_name(metric), bbox_inches="tight")
+
+    def _plot_position_distribution(self):
+        if POSITION_COLUMN not in self.table.names:
+            return
+        starts = position_starts(self.table.column(POSITION_COLUMN))
+        positions, counts = np.unique(starts, return_counts=True)
+        plt.figure(figsize=(14, 6))
+        plt.bar(positions, counts, color='skyblue', edgecolor='black')
+        plt.title('Positions of the Maximum Obs/Exp Ratio of the Kmers')
+        plt.xlabel('Position in Read (bp)')
+        plt.ylabel('Number of Kmers')
+        plt.grid(True, axis='y', linestyle='--', linewidth=0.5, alpha=0.7)
+        self.save_plot('kmer_max_position_distribution.png', bbox_inches="tight")
 
+    def _plot_position_heatmap(self, top_n):
+        if POSITION_COLUMN not in self.table.names or 'Obs/Exp Max' not in self.table.names:
+            return
+        ratios = self.table.column('Obs/Exp Max')
+        rows = top_n_indices(ratios, top_n)
+        starts = position_starts(self.table.column(POSITION_COLUMN))
+        positions = np.unique(starts)
+        # Each kmer has one cell, its ratio at the position of its maximum
+        matrix = np.full((len(rows), len(positions)), np.nan)
+        matrix[np.arange(len(rows)), np.searchsorted(positions, starts[rows])] = ratios[rows]
+        fig, ax = plt.subplots(figsize=(14, 8))
+        image = ax.imshow(matrix, aspect='auto', interpolation='nearest', cmap='viridis')
+        fig.colorbar(image, ax=ax, label='Obs/Exp Max')
+        ax.set_xticks(np.arange(len(positions)))
+        ax.set_xticklabels([str(position) for position in positions], rotation=90)
+        ax.set_yticks(np.arange(len(rows)))
+        ax.set_yticklabels(self.table.column('#Sequence')[rows])
+        ax.set_title(f'Position of the Maximum Obs/Exp Ratio of the Top {len(rows)} Kmers')
+        ax.set_xlabel('Position in Read (bp)')
+        ax.set_ylabel('K-mer Sequence')
+        self.save_plot('kmer_position_heatmap.png', bbox_inches="tight")
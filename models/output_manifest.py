@@ -0,0 +1,87 @@
+"""Manifest of the outputs written for each section, used to skip unchanged sections"""
+# David Oluwasusi 6th November 2024
+
+import hashlib
+import json
+import os
+import constants
+
+MANIFEST_FILE = ".fastqc_reporter_manifest.json"
+
+
+class OutputManifest:
+    """
+    Records, for each section written to an output folder, a hash of everything the
+    outputs depend on (section text, status, reporter version and plot settings) and
+    the files that were produced, so a rerun can skip sections that did not change.
+
+    Attributes:
+        output_folder (str): The folder the manifest describes.
+        entries (dict): section title -> {"hash": str, "files": List[str]}
+    """
+    def __init__(self, output_folder, entries=None):
+        self.output_folder = output_folder
+        self.entries = entries or {}
+
+    @property
+    def path(self):
+        """Path of the manifest file"""
+        return os.path.join(self.output_folder, MANIFEST_FILE)
+
+    @classmethod
+    def load(cls, output_folder):
+        """Loads the manifest of an output folder, an empty one when missing or unreadable"""
+        manifest = cls(output_folder)
+        try:
+            with open(manifest.path, 'r', encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+        if stored.get("version") == constants.REPORTER_VERSION:
+            manifest.entries = stored.get("sections", {})
+        return manifest
+
+    @staticmethod
+    def section_hash(title, text, status, settings):
+        """
+        Hashes everything the outputs of a section depend on.
+
+        Args:
+            title (str): title of the section.
+            text (str): the section content.
+            status (str): the pass/warn/fail status of the section.
+            settings (dict): plot options and other settings that change the outputs.
+        """
+        digest = hashlib.sha256()
+        for part in (constants.REPORTER_VERSION, title, status,
+                     json.dumps(settings, sort_keys=True, default=str)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_current(self, title, section_hash):
+        """True when the section was written with the same hash and its files still exist"""
+        entry = self.entries.get(title)
+        if entry is None or entry["hash"] != section_hash:
+            return False
+        return all(os.path.exists(os.path.join(self.output_folder, title, name))
+                   for name in entry["files"])
+
+    def record(self, title, section_hash):
+        """Records the hash of a section that was just written, with the files in its folder"""
+        section_dir = os.path.join(self.output_folder, title)
+        try:
+            files = sorted(name for name in os.listdir(section_dir)
+                           if os.path.isfile(os.path.join(section_dir, name)))
+        except OSError:
+            files = []
+        self.entries[title] = {"hash": section_hash, "files": files}
+
+    def save(self):
+        """Writes the manifest through a temporary file so a crash never leaves it half written"""
+        os.makedirs(self.output_folder, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding="utf-8") as f:
+            json.dump({"version": constants.REPORTER_VERSION, "sections": self.entries}, f, indent=1)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,176 @@
+"""Buffered writer of the report, flag and plot files, flushed from a background thread"""
+# David Oluwasusi 6th November 2024
+
+import os
+import queue
+import threading
+import time
+
+
+class OutputWriter:
+    """
+    Writes the output files of the sections. Each output directory is created once,
+    files are written to a temporary name and renamed into place so a reader never
+    sees a partial file, and in background mode the writes are queued and done by
+    a worker thread while the next section is processed. Progress lines and stage
+    timings of a file are only recorded once it has been written.
+
+    Attributes:
+        background (bool): Queue the writes for the worker thread instead of writing them now.
+        quiet (bool): Do not print a line for every file written.
+        errors (List[str]): Failures of queued writes, reported by flush.
+    """
+    def __init__(self, background=True, quiet=False):
+        self.background = background
+        self.quiet = quiet
+        self.errors = []
+        self._created = set()
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes get a writer of their own, writing as they go
+        return {"background": False, "quiet": self.quiet}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def announce(self, *message):
+        """Prints a progress line unless the writer is quiet"""
+        if not self.quiet:
+            print(*message)
+
+    def write(self, folder, file_name, data, message=None, stage=None):
+        """
+        Writes, or queues, one output file.
+
+        Args:
+            folder (str): the directory of the file, created on first use.
+            file_name (str): name of the file in the directory.
+            data (str | bytes): the content, text is encoded as UTF-8.
+            message (str, optional): progress line printed with the path once the file
+                is in place, e.g. 'Report successfully written to'.
+            stage (tuple, optional): (profiler, stage name, section title) recording the
+                time of the write itself, not of queueing it.
+
+        Returns:
+            str: the path of the file.
+
+        Raises:
+            OSError: when writing directly and the file cannot be written.
+        """
+        path = os.path.join(folder, file_name)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not self.background:
+            self._write(folder, path, data, stage)
+            if message:
+                self.announce(message, path)
+            return path
+        if self._thread is None:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._drain, name="output-writer", daemon=True)
+            self._thread.start()
+        self._queue.put((folder, path, data, message, stage))
+        return path
+
+    def _write(self, folder, path, data, stage=None):
+        """Writes one file and records the time it took"""
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        self._replace(folder, path, data)
+        if stage is not None:
+            profiler, name, section = stage
+            profiler.add(name, section, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+    def _replace(self, folder, path, data):
+        """Creates the folder once and atomically replaces the file"""
+        if folder not in self._created:
+            os.makedirs(folder, exist_ok=True)
+            self._created.add(folder)
+        temp_path = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        try:
+            try:
+                f = open(temp_path, 'wb')
+            except FileNotFoundError:
+                # the folder was removed since it was created
+                os.makedirs(folder, exist_ok=True)
+                f = open(temp_path, 'wb')
+            with f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def _drain(self):
+        """Worker thread: writes the queued files in order"""
+        while True:
+            folder, path, data, message, stage = self._queue.get()
+            try:
+                self._write(folder, path, data, stage)
+            except OSError as e:
+                with self._lock:
+                    self.errors.append(f"Error creating directory or writing file: {e}")
+            else:
+                if message:
+                    try:
+                        self.announce(message, path)
+                    except OSError:
+                        # standard output was closed, the file itself is written
+                        pass
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Waits for the queued writes and prints the ones that failed.
+
+        Returns:
+            bool: True when every file was written.
+        """
+        if self._queue is not None:
+            self._queue.join()
+        with self._lock:
+            errors, self.errors = self.errors, []
+        for error in errors:
+            print(error)
+        return not errors
+
+
+# Writer of sections created without one, writing each file immediately
+DIRECT_WRITER = OutputWriter(background=False)
+
+
+class MemoryWriter(OutputWriter):
+    """
+    Writer keeping the output files in memory instead of writing them, for backends
+    that store them elsewhere such as the SQLite database.
+
+    Attributes:
+        files (dict): (section title, file name) -> bytes, the title being the last
+            part of the folder the file was written to.
+    """
+    def __init__(self, quiet=True):
+        super().__init__(background=False, quiet=quiet)
+        self.files = {}
+
+    def __getstate__(self):
+        return {"quiet": self.quiet, "files": {}}
+
+    def __setstate__(self, state):
+        self.__init__(quiet=state["quiet"])
+
+    def write(self, folder, file_name, data, message=None, stage=None):
+        """Keeps the content of one output file, see OutputWriter.write"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.files[(os.path.basename(folder), file_name)] = data
+        path = os.path.join(folder, file_name)
+        if message:
+            self.announce(message, path)
+        return path
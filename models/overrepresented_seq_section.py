@@ -0,0 +1,72 @@
+"""Model to manage the overrepresented sequences section of the fastqc file, inherits from Section model"""
+# David Oluwasusi 6th November 2024
+
+import os
+from models.base_section import Section
+
+SOURCES_FILE = "sources.tsv"
+SOURCES_COLUMNS = ("Sequence", "Count", "Percentage", "FastQC Source", "Matched Source", "Strand",
+                   "Identity", "Overlap")
+
+
+def sources_text(table, matcher):
+    """
+    The overrepresented sequences of a section with their best hit in a contaminant library.
+
+    Args:
+        table (SectionTable): the parsed Overrepresented sequences table.
+        matcher (ContaminantMatcher): the contaminant library.
+
+    Returns:
+        str: a tab separated table, one row per sequence, the match columns empty for
+            sequences without a hit.
+    """
+    lines = ["\t".join(SOURCES_COLUMNS)]
+    if not table.is_empty and len(table):
+        names = table.names
+        sequences = table.column(names[0])
+        for sequence, count, percentage, source, match in zip(
+                sequences, table.column(names[1]), table.column(names[2]), table.column(names[3]),
+                matcher.annotate(sequences)):
+            row = [sequence, str(count), str(percentage), source]
+            if match is None:
+                row += ["No Hit", "", "", ""]
+            else:
+                row += [match.name, match.strand, f"{match.identity:.1f}", str(match.overlap)]
+            lines.append("\t".join(row))
+    return "\n".join(lines) + "\n"
+
+
+class OverrepresentedSeqSection(Section):
+    """
+    Represents the overrepresented sequences section in the fastqc file.
+    It inherits from the `Section` class and adds the matching of its sequences
+    against a local contaminant library, next to the `Possible Source` FastQC wrote.
+
+    Attributes:
+        title (str): The title of the section.
+        text (str): The primary data content for the section, to be saved in a report file.
+        flag (str): A status or quality flag associated with this section.
+        output_folder (str): The path to the root folder for
+            storing report file, flag file and generated plots.
+
+    Methods:
+        write_sources(matcher): Writes the library hit of each sequence to sources.tsv
+    """
+    __slots__ = ()
+
+    def write_sources(self, matcher):
+        """
+        Writes the best library hit of each overrepresented sequence to sources.tsv.
+
+        Args:
+            matcher (ContaminantMatcher): the contaminant library.
+        """
+        folder = os.path.join(self.output_folder, self.title)
+        try:
+            with self.profiler.stage("match", self.title):
+                text = sources_text(self.table, matcher)
+            self.writer.write(folder, SOURCES_FILE, text,
+                              message="Sources successfully written to", stage=(self.profiler, "sources", self.title))
+        except OSError as e:
+            print(f"Error creating directory or writing file: {e}")
@@ -1,12 +1,10 @@
 """Models to manage the per sequence quality section of the fastqc file"""
 # David Oluwasusi 6th November 2024
 
-import os
 import sys
-import pandas as pd
-import seaborn as sns
 import matplotlib.pyplot as plt
 from  models.base_section import Section
+from models.plot_style import set_category_ticks
 
 class PerSeqQualSection(Section):
     """
@@ -17,28 +15,34 @@ class PerSeqQualSection(Section):
 
     Attributes:
         title (str): The title of the section.
-        data (List): The primary data content for the section, to be saved in a report file.
+        text (str): The primary data content for the section, to be saved in a report file.
         flag (str): A status or quality flag associated with this section.
         output_folder (str): The path to the root folder for 
             storing report file, flag file and generated plots.
 
     Methods:
         plot_section(): Generates a bar plot representing the quality score and the read count
+        draw(ax): Draws the same bar plot with matplotlib only
     """
+    __slots__ = ()
+
+    def draw(self, ax):
+        # seaborn draws bars at 0, 1, 2... labelled with the quality
+        labels = [str(quality) for quality in self.table.column('#Quality')]
+        ax.bar(range(len(labels)), self.table.column('Count'), color='blue')
+        set_category_ticks(ax, labels)
+        ax.set_title('Per Sequence Quality Distribution')
+        ax.set_xlabel('Quality Score')
+        ax.set_ylabel('Read Count')
+        ax.grid(True, linestyle='--', linewidth=0.5)
+
     def plot_section(self):
-        # Load the data from a text file, assuming it's tab-separated
-        file_path = os.path.join(self.output_folder, self.title, 'report.txt')
-        try:
-            data = pd.read_csv(file_path, sep='\t')
-        except FileNotFoundError:
-            print(f"Error: The file '{file_path}' was not found.")
-            sys.exit(1)
-        except pd.errors.EmptyDataError:
-            print(f"Error: The file '{file_path}' is empty.")
-            sys.exit(1)
-        except pd.errors.ParserError:
-            print(f"Error: The file '{file_path}' could not be parsed. Please check the file format.")
-            sys.exit(1)
+        if self.style.fast:
+            self.plot_fast('per_sequence_quality_plot.png', (10, 6))
+            return
+        import seaborn as sns
+
+        data = self.table.frame
 
         # Create the plot
         plt.figure(figsize=(10, 6))
@@ -49,30 +53,12 @@ class PerSeqQualSection(Section):
             print(f"ValueError while creating plot: {ve}. Please check the data values.")
             sys.exit(1)
         except TypeError as te:
-            print(f"TypeError while creating plot: {te}. Verify data types in the 'report.txt' file.")
+            print(f"TypeError while creating plot: {te}. Verify data types in the section data.")
             sys.exit(1)
         # Add titles and labels
         plt.title('Per Sequence Quality Distribution')
         plt.xlabel('Quality Score')
         plt.ylabel('Read Count')
         plt.grid(True, linestyle='--', linewidth=0.5)
-        # Ensure the output folder exists
-        os.makedirs(self.output_folder, exist_ok=True)
-        # Define the path to save the plot
-        
-        try:
-            output_path = os.path.join(self.output_folder + '/'  + self.title, 'per_sequence_quality_plot.png')
-            plt.savefig(output_path)
-        except PermissionError:
-            print(f"PermissionError: Insufficient permissions to save the plot to '{output_path}'.")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"FileNotFoundError: The path '{output_path}' is invalid. Please verify the output folder structure.")
-            sys.exit(1)
-        except IOError as ioe:
-            print(f"IOError: Could not save the plot to '{output_path}': {ioe}")
-            sys.exit(1)
-        finally:
-            # Save the plot
-            plt.close()  # Close the plot to free memory
-            print(f"Plot saved to {output_path}")
+        # Save the plot
+        self.save_plot('per_sequence_quality_plot.png')
@@ -2,12 +2,77 @@
 # David Oluwasusi 6th November 2024
 
 import sys
-import os
-import pandas as pd
-import seaborn as sns
+import numpy as np
 import matplotlib.pyplot as plt
 from  models.base_section import Section
 
+# Above this many tile x cycle cells the 'auto' renderer switches to the raster heatmap
+RASTER_MIN_CELLS = 20000
+# Most tick labels drawn on each axis of the raster heatmap
+MAX_TICKS = 40
+
+
+def split_tile_ids(tile_ids):
+    """
+    Splits Illumina tile IDs into lane and surface numbers.
+    Tile numbers are 4 digits (surface, swath, tile: 1101) or 5 digits on patterned
+    flowcells (surface, swath, 3 digit tile: 11101). IDs of 6 digits or more carry
+    the lane as a multiple of 100000, as written when several lanes are merged.
+
+    Args:
+        tile_ids (numpy.ndarray): the tile IDs.
+
+    Returns:
+        tuple: (lanes, surfaces) as int64 arrays, lane 0 when the ID carries no lane.
+    """
+    tile_ids = np.asarray(tile_ids, dtype=np.int64)
+    lanes = tile_ids // 100000
+    tiles = tile_ids % 100000
+    digits = np.floor(np.log10(np.maximum(tiles, 1))).astype(np.int64)
+    surfaces = tiles // 10 ** digits
+    return lanes, surfaces
+
+
+def tile_matrix(table):
+    """
+    Builds the tile x cycle matrix of mean quality deviations straight from the
+    typed columns, into a preallocated array.
+
+    Args:
+        table (SectionTable): the parsed per tile table ('#Tile', 'Base', 'Mean').
+
+    Returns:
+        tuple: (matrix, tile IDs, cycle labels), cells missing from the section are NaN.
+    """
+    tile_pos = table.names.index('#Tile')
+    base_pos = table.names.index('Base')
+    tiles, tile_index = np.unique(table.columns[tile_pos], return_inverse=True)
+    base_labels = table.categories[base_pos]
+    if base_labels is None:
+        cycles, base_index = np.unique(table.columns[base_pos], return_inverse=True)
+    else:
+        # Grouped cycles such as '10-14', ordered by their first cycle
+        order = sorted(range(len(base_labels)), key=lambda i: int(base_labels[i].split('-')[0]))
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        base_index = rank[table.columns[base_pos]]
+        cycles = np.array([base_labels[i] for i in order], dtype=object)
+    matrix = np.full((len(tiles), len(cycles)), np.nan)
+    matrix[tile_index, base_index] = table.column('Mean')
+    return matrix, tiles, cycles
+
+
+def bin_rows(matrix, size):
+    """Averages consecutive blocks of `size` rows, ignoring NaN cells"""
+    if size <= 1 or matrix.shape[0] == 0:
+        return matrix
+    pad = (-matrix.shape[0]) % size
+    padded = np.vstack([matrix, np.full((pad, matrix.shape[1]), np.nan)])
+    blocks = padded.reshape(-1, size, matrix.shape[1])
+    counts = np.sum(~np.isnan(blocks), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(blocks, axis=1) / counts
+
 
 class PerTileSeqSection(Section):
     """
@@ -18,29 +83,59 @@ class PerTileSeqSection(Section):
 
     Attributes:
         title (str): The title of the section.
-        data (List): The primary data content for the section, to be saved in a report file.
+        text (str): The primary data content for the section, to be saved in a report file.
         flag (str): A status or quality flag associated with this section.
-        output_folder (str): The path to the root folder for 
+        output_folder (str): The path to the root folder for
             storing report file, flag file and generated plots.
 
     Methods:
         plot_section(): Generates a heatmap representing the quality score across base
                         positions for each tile, then saves it as a PNG file.
+        draw(ax): Draws the tile x cycle heatmap with matplotlib only
     """
-    def plot_section(self):
-        # Load the data from a text file, assuming it's tab-separated
-        file_path = os.path.join(self.output_folder, self.title, 'report.txt')
-        try:
-            data = pd.read_csv(file_path, sep='\t')
-        except FileNotFoundError:
-            print(f"Error: The file '{file_path}' was not found.")
-            sys.exit(1)
-        except pd.errors.EmptyDataError:
-            print(f"Error: The file '{file_path}' is empty.")
-            sys.exit(1)
-        except pd.errors.ParserError:
-            print(f"Error: The file '{file_path}' could not be parsed. Please check the file format.")
-            sys.exit(1)
+    __slots__ = ()
+
+    def plot_section(self, renderer='auto', tile_bin=1, cycle_bin=1, group_by='surface'):
+        """
+        Args:
+            renderer (str): 'seaborn', 'raster' (an image of the tile x cycle matrix,
+                for large flowcells) or 'auto' to pick raster above RASTER_MIN_CELLS cells.
+                The fast plotting backend always draws the raster heatmap.
+            tile_bin (int): raster only, average this many consecutive tiles per row.
+            cycle_bin (int): raster only, average this many consecutive cycles per column.
+            group_by (str): raster only, 'lane', 'surface' or None to separate
+                the tiles by the lane/surface parsed from their ID.
+        """
+        if self.style.fast:
+            renderer = 'raster'
+        if renderer == 'auto':
+            tile_column = self.table.columns[self.table.names.index('#Tile')]
+            base_column = self.table.columns[self.table.names.index('Base')]
+            cells = len(np.unique(tile_column)) * len(np.unique(base_column))
+            renderer = 'raster' if cells > RASTER_MIN_CELLS else 'seaborn'
+        if renderer == 'raster':
+            self._plot_raster(tile_bin, cycle_bin, group_by)
+        else:
+            self._plot_seaborn()
+
+    def draw(self, ax):
+        matrix, tiles, cycles = tile_matrix(self.table)
+        image = ax.imshow(matrix, aspect='auto', interpolation='nearest', cmap='coolwarm')
+        ax.figure.colorbar(image, ax=ax, label='Mean Quality Score')
+        x_step = max(1, len(cycles) // MAX_TICKS + 1)
+        ax.set_xticks(np.arange(0, len(cycles), x_step))
+        ax.set_xticklabels([str(cycle) for cycle in cycles[::x_step]], rotation=90)
+        y_step = max(1, len(tiles) // MAX_TICKS + 1)
+        ax.set_yticks(np.arange(0, len(tiles), y_step))
+        ax.set_yticklabels([str(tile) for tile in tiles[::y_step]])
+        ax.set_title('Per Tile Sequence Quality Across Base Positions')
+        ax.set_xlabel('Base Position')
+        ax.set_ylabel('Tile ID')
+
+    def _plot_seaborn(self):
+        import seaborn as sns
+
+        data = self.table.frame
         # Pivot the data to format it for the heatmap
         heatmap_data = data.pivot(index='#Tile', columns='Base', values='Mean')
         # Create the heatmap
@@ -58,30 +153,80 @@ class PerTileSeqSection(Section):
             print(f"ValueError while creating plot: {ve}. Please check the data values.")
             sys.exit(1)
         except TypeError as te:
-            print(f"TypeError while creating plot: {te}. Verify data types in the 'report.txt' file.")
+            print(f"TypeError while creating plot: {te}. Verify data types in the section data.")
             sys.exit(1)
         # Add titles and labels
         plt.title('Per Tile Sequence Quality Across Base Positions', fontsize=16, pad=20)
         plt.xlabel('Base Position', fontsize=14)
         plt.ylabel('Tile ID', fontsize=14)
-        
-        # Ensure the output folder exists
+        # Save the plot
+        self.save_plot('per_tile_sequence_quality_heatmap.png')
+
+    def _plot_raster(self, tile_bin=1, cycle_bin=1, group_by='surface'):
         try:
-            plot_folder = os.path.join(self.output_folder, self.title)
-            os.makedirs(plot_folder, exist_ok=True)
-            # Define the path to save the plot
-            output_path = os.path.join(plot_folder, 'per_tile_sequence_quality_heatmap.png')
-            # Save the plot
-            plt.savefig(output_path)
-        except PermissionError:
-            print(f"PermissionError: Insufficient permissions to save the plot to '{output_path}'.")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"FileNotFoundError: The path '{output_path}' is invalid. Please verify the output folder structure.")
-            sys.exit(1)
-        except IOError as ioe:
-            print(f"IOError: Could not save the plot to '{output_path}': {ioe}")
+            matrix, tiles, cycles = tile_matrix(self.table)
+        except ValueError as ve:
+            print(f"ValueError while creating plot: {ve}. Please check the data values.")
             sys.exit(1)
-        finally:
-            plt.close()  # Close the plot to free memory
-            print(f"Plot saved to {output_path}")
+
+        # Rows are sorted by tile ID, so lanes and surfaces are already contiguous blocks
+        lanes, surfaces = split_tile_ids(tiles)
+        if group_by == 'lane':
+            keys = lanes
+        elif group_by == 'surface':
+            keys = lanes * 10 + surfaces
+        else:
+            keys = np.zeros(len(tiles), dtype=np.int64)
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(tiles)]))
+
+        # Bin tiles within each group so no bin mixes two lanes or surfaces
+        blocks = []
+        row_labels = []
+        group_rows = []
+        for start, end in zip(starts, ends):
+            blocks.append(bin_rows(matrix[start:end], tile_bin))
+            row_labels.extend(tiles[start:end:max(tile_bin, 1)])
+            group_rows.append(len(row_labels))
+        matrix = np.vstack(blocks) if blocks else matrix
+        matrix = bin_rows(matrix.T, cycle_bin).T
+        cycles = cycles[::max(cycle_bin, 1)]
+
+        fig, ax = plt.subplots(figsize=(14, 10))
+        image = ax.imshow(matrix, aspect='auto', interpolation='nearest', cmap='coolwarm')
+        fig.colorbar(image, ax=ax, label='Mean Quality Score')
+
+        x_step = max(1, len(cycles) // MAX_TICKS + 1)
+        ax.set_xticks(np.arange(0, len(cycles), x_step))
+        ax.set_xticklabels([str(cycle) for cycle in cycles[::x_step]], rotation=90)
+        if group_by in ('lane', 'surface'):
+            # One label per group, with a line between groups
+            centers = []
+            labels = []
+            previous = 0
+            for start, end_row in zip(starts, group_rows):
+                centers.append((previous + end_row - 1) / 2)
+                lane, surface = lanes[start], surfaces[start]
+                label = f"surface {surface}" if group_by == 'surface' else ""
+                if lane or group_by == 'lane':
+                    label = f"lane {lane} {label}".strip()
+                labels.append(label)
+                if end_row < matrix.shape[0]:
+                    ax.axhline(end_row - 0.5, color='black', linewidth=1)
+                previous = end_row
+            ax.set_yticks(centers)
+            ax.set_yticklabels(labels)
+            ylabel = 'Tile group'
+        else:
+            y_step = max(1, len(row_labels) // MAX_TICKS + 1)
+            ax.set_yticks(np.arange(0, len(row_labels), y_step))
+            ax.set_yticklabels([str(tile) for tile in row_labels[::y_step]])
+            ylabel = 'Tile ID'
+
+        # Add titles and labels
+        ax.set_title('Per Tile Sequence Quality Across Base Positions', fontsize=16, pad=20)
+        ax.set_xlabel('Base Position', fontsize=14)
+        ax.set_ylabel(ylabel, fontsize=14)
+        # Save the plot
+        self.save_plot('per_tile_sequence_quality_heatmap.png')
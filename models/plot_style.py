@@ -0,0 +1,77 @@
+"""Settings shared by the plots of a run: plotting backend, resolution and PNG compression"""
+# David Oluwasusi 6th November 2024
+
+BACKENDS = ("seaborn", "fast")
+
+
+class PlotStyle:
+    """
+    How the sections draw and encode their plots.
+
+    Attributes:
+        backend (str): 'seaborn', the original charts, or 'fast', the same charts drawn
+            with plain matplotlib calls on the NumPy columns, without importing seaborn
+            or reshaping DataFrames.
+        dpi (int): resolution of the images, matplotlib's default when None.
+        compress_level (int): zlib level (0-9) of the PNG images, matplotlib's default when None.
+            Lower levels encode faster and give larger files.
+    """
+    __slots__ = ('backend', 'dpi', 'compress_level')
+
+    def __init__(self, backend="seaborn", dpi=None, compress_level=None):
+        self.backend = backend
+        self.dpi = dpi
+        self.compress_level = compress_level
+
+    @property
+    def fast(self):
+        """True when the plots are drawn with the matplotlib only backend"""
+        return self.backend == "fast"
+
+    def savefig_kwargs(self, image_format):
+        """Extra `plt.savefig` arguments of an image format"""
+        kwargs = {}
+        if self.dpi is not None:
+            kwargs["dpi"] = self.dpi
+        if self.compress_level is not None and image_format == "png":
+            kwargs["pil_kwargs"] = {"compress_level": self.compress_level}
+        return kwargs
+
+    def settings(self):
+        """The settings that differ from the defaults, e.g. for output manifests"""
+        defaults = PlotStyle()
+        return {name: getattr(self, name) for name in self.__slots__
+                if getattr(self, name) != getattr(defaults, name)}
+
+
+DEFAULT_STYLE = PlotStyle()
+
+
+def category_axis(values):
+    """
+    X positions of a column drawn as categories, the way seaborn places string columns:
+    numeric columns keep their values, labels such as '10-14' are drawn at 0, 1, 2...
+
+    Returns:
+        tuple: (x positions, tick labels or None when the values are the positions)
+    """
+    import numpy as np
+
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        return values, None
+    return np.arange(len(values)), [str(value) for value in values]
+
+
+def set_category_ticks(ax, labels, axis="x", max_ticks=None):
+    """Labels the categories of an axis, every n-th one when there are more than max_ticks"""
+    if labels is None:
+        return
+    step = 1 if not max_ticks else -(-len(labels) // max_ticks)
+    positions = range(0, len(labels), step)
+    if axis == "x":
+        ax.set_xticks(positions)
+        ax.set_xticklabels(labels[::step], rotation=90 if step > 1 or len(labels) > 20 else 0)
+    else:
+        ax.set_yticks(positions)
+        ax.set_yticklabels(labels[::step])
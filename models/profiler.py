@@ -0,0 +1,165 @@
+"""Per-stage timing and memory profiler used by the --profile option"""
+# David Oluwasusi 6th November 2024
+
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+
+class StageProfiler:
+    """
+    Records the wall time, CPU time and, optionally, the tracemalloc peak of named
+    stages of a run, such as parsing, the report/flag writes of each section, figure
+    construction and PNG encoding.
+
+    Attributes:
+        enabled (bool): When False, stages cost nothing and nothing is recorded.
+        memory (bool): Also record the tracemalloc peak of each stage. Tracing slows
+            every allocation down several times, so the timings of a memory profile
+            are not comparable with those of a timing only profile.
+        records (List[dict]): One entry per finished stage:
+            {"stage", "section", "wall_s", "cpu_s", "peak_bytes"}, peak_bytes is
+            None without memory.
+    """
+    def __init__(self, enabled=True, memory=False):
+        self.enabled = enabled
+        self.memory = memory
+        self.records = []
+        # Peak memory seen so far by each open stage, innermost last
+        self._peaks = []
+
+    def __getstate__(self):
+        # Open stages belong to the process that opened them
+        return {"enabled": self.enabled, "memory": self.memory, "records": [], "_peaks": []}
+
+    @contextlib.contextmanager
+    def stage(self, name, section=None):
+        """
+        Profiles the enclosed block.
+
+        Args:
+            name (str): the stage, e.g. 'parse', 'report', 'flag', 'plot' or 'encode'.
+            section (str, optional): title of the section the stage belongs to.
+        """
+        if not self.enabled:
+            yield
+            return
+        if not self.memory:
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            try:
+                yield
+            finally:
+                self.records.append({
+                    "stage": name,
+                    "section": section,
+                    "wall_s": time.perf_counter() - wall_start,
+                    "cpu_s": time.process_time() - cpu_start,
+                    "peak_bytes": None,
+                })
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        start_size, peak = tracemalloc.get_traced_memory()
+        if self._peaks:
+            # Keep the parent's peak before resetting it for this stage
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        tracemalloc.reset_peak()
+        self._peaks.append(start_size)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(self._peaks.pop(), peak)
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            self.records.append({
+                "stage": name,
+                "section": section,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "peak_bytes": max(peak - start_size, 0),
+            })
+
+    def add(self, name, section, wall_s, cpu_s):
+        """Records a stage timed by the caller, e.g. a file written by the writer thread"""
+        if self.enabled:
+            self.records.append({"stage": name, "section": section, "wall_s": wall_s,
+                                 "cpu_s": cpu_s, "peak_bytes": None})
+
+    def extend(self, records):
+        """Adds the records of stages that ran in another process"""
+        self.records.extend(records)
+
+    def summary(self):
+        """
+        Groups the records by section, repeated stages of a section (e.g. the encode of
+        each of its plots) adding up their times, with their number under 'count' and
+        the largest of their peaks.
+        The 'figure' stage of a plot is its time minus the time spent encoding its images.
+
+        Returns:
+            dict: section title (or 'run' for stages outside a section) -> stage -> record
+        """
+        sections = {}
+        for record in self.records:
+            stages = sections.setdefault(record["section"] or "run", {})
+            total = stages.get(record["stage"])
+            if total is None:
+                stages[record["stage"]] = {"wall_s": record["wall_s"], "cpu_s": record["cpu_s"],
+                                           "peak_bytes": record["peak_bytes"], "count": 1}
+                continue
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["count"] += 1
+            if record["peak_bytes"] is not None:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0, record["peak_bytes"])
+        for stages in sections.values():
+            if "plot" in stages:
+                encode = stages.get("encode", {"wall_s": 0.0, "cpu_s": 0.0})
+                stages["figure"] = {
+                    "wall_s": stages["plot"]["wall_s"] - encode["wall_s"],
+                    "cpu_s": stages["plot"]["cpu_s"] - encode["cpu_s"],
+                    "peak_bytes": stages["plot"]["peak_bytes"],
+                    "count": stages["plot"]["count"],
+                }
+        return sections
+
+    def to_dict(self, **metadata):
+        """
+        The profile as a JSON serialisable dictionary.
+
+        Args:
+            **metadata: extra top level fields, e.g. the input path.
+        """
+        profile = dict(metadata)
+        profile["memory"] = self.memory
+        profile["total_wall_s"] = sum(record["wall_s"] for record in self.records
+                                      if record["stage"] in ("parse", "report", "flag", "plot"))
+        profile["sections"] = self.summary()
+        profile["stages"] = self.records
+        return profile
+
+    def write(self, path, **metadata):
+        """
+        Writes the profile as JSON.
+
+        Args:
+            path (str): path of the JSON file.
+            **metadata: extra top level fields, see to_dict.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profile = self.to_dict(**metadata)
+        with open(path, 'w', encoding="utf-8") as f:
+            json.dump(profile, f, indent=1)
+        print("Profile written to", path)
+
+
+# Shared profiler of sections created without one
+NULL_PROFILER = StageProfiler(enabled=False)
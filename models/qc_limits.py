@@ -0,0 +1,236 @@
+"""Re-evaluates the pass/warn/fail status of the sections against FastQC style limits"""
+# David Oluwasusi 6th November 2024
+
+import sys
+import warnings
+import numpy as np
+import constants as sections
+
+# FastQC's own limits.txt, used for the modules a limits file does not mention
+DEFAULT_LIMITS = {
+    ("duplication", "warn"): 70, ("duplication", "error"): 50,
+    ("kmer", "warn"): 2, ("kmer", "error"): 5,
+    ("n_content", "warn"): 5, ("n_content", "error"): 20,
+    ("overrepresented", "warn"): 0.1, ("overrepresented", "error"): 1,
+    ("quality_base_lower", "warn"): 10, ("quality_base_lower", "error"): 5,
+    ("quality_base_median", "warn"): 25, ("quality_base_median", "error"): 20,
+    ("sequence", "warn"): 10, ("sequence", "error"): 20,
+    ("gc_sequence", "warn"): 15, ("gc_sequence", "error"): 30,
+    ("quality_sequence", "warn"): 27, ("quality_sequence", "error"): 20,
+    ("tile", "warn"): 5, ("tile", "error"): 10,
+    ("sequence_length", "warn"): 1, ("sequence_length", "error"): 1,
+    ("adapter", "warn"): 5, ("adapter", "error"): 10,
+}
+
+# Section -> (limits module, True when high values are bad) of each of its checks
+CHECKS = {
+    sections.PER_BASE_SEQ: (("quality_base_lower", False), ("quality_base_median", False)),
+    sections.PER_TILE_SEQ: (("tile", True),),
+    sections.PER_SEQ_QUALITY_SCORES: (("quality_sequence", False),),
+    sections.PER_BASE_SEQ_CONTENT: (("sequence", True),),
+    sections.PER_SEQ_GC_CONTENT: (("gc_sequence", True),),
+    sections.PER_BASE_N_CONTENT: (("n_content", True),),
+    sections.SEQ_LEN_DIST: (("sequence_length", True),),
+    sections.SEQ_DUPLICATION_LEVEL: (("duplication", False),),
+    sections.OVERREPRESENTED_SEQ: (("overrepresented", True),),
+    sections.ADAPTER_CONTENT: (("adapter", True),),
+    sections.KMER_CONTENT: (("kmer", True),),
+}
+STATUSES = np.array(["pass", "warn", "fail"])
+
+
+class QCLimits:
+    """
+    Thresholds of a FastQC `limits.txt` file: one '<module> <warn|error|ignore> <value>'
+    line per limit, '#' comments. Modules not in the file keep FastQC's default limits.
+
+    Attributes:
+        limits (dict): (module, level) -> value.
+        path (str): the limits file, empty for the defaults.
+    """
+    def __init__(self, limits=None, path=""):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        """Reads a limits file, exits when it cannot be read or a line is malformed"""
+        limits = {}
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                for number, line in enumerate(f, start=1):
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    fields = line.split()
+                    if len(fields) != 3 or fields[1] not in ("warn", "error", "ignore"):
+                        print(f"Error: line {number} of the limits file '{path}' is not '<module> <warn|error|ignore> <value>'.")
+                        sys.exit(1)
+                    limits[(fields[0], fields[1])] = float(fields[2])
+        except OSError as e:
+            print(f"Error: The limits file '{path}' could not be read ({e}).")
+            sys.exit(1)
+        except ValueError:
+            print(f"Error: line {number} of the limits file '{path}' has a value that is not a number.")
+            sys.exit(1)
+        return cls(limits, path)
+
+    def ignored(self, module):
+        """True when the file asks to ignore a module"""
+        return bool(self.limits.get((module, "ignore"), 0))
+
+
+def _stack(tables, name):
+    """
+    One column of every sample's table as a (samples, rows) float array, shorter
+    tables padded with NaN. Rows are not aligned by position, only reduced per sample.
+    """
+    columns = [np.asarray(table.column(name), dtype=np.float64) if table is not None and name in table.names
+               else np.array([]) for table in tables]
+    stacked = np.full((len(columns), max((len(column) for column in columns), default=0)), np.nan)
+    for row, column in enumerate(columns):
+        stacked[row, :len(column)] = column
+    return stacked
+
+
+def _reduce(function, array):
+    """Per sample reduction ignoring NaN, NaN for samples without values"""
+    if array.shape[1] == 0:
+        return np.full(array.shape[0], np.nan)
+    with warnings.catch_warnings():
+        # all-NaN rows are samples without the section
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return function(array, axis=1)
+
+
+def _gc_deviation(gc, counts):
+    """
+    Percentage of the reads outside a normal distribution centred on the GC mode, with
+    the spread around the mode, the way FastQC scores the per sequence GC content.
+    """
+    filled = np.nan_to_num(counts)
+    total = filled.sum(axis=1)
+    mode = np.take_along_axis(gc, np.argmax(filled, axis=1)[:, None], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = np.nansum(filled * (gc - mode) ** 2, axis=1) / (total - 1)
+        sd = np.sqrt(variance)[:, None]
+        theoretical = np.exp(-0.5 * ((gc - mode) / sd) ** 2) / (sd * np.sqrt(2 * np.pi)) * total[:, None]
+        deviation = np.nansum(np.abs(theoretical - counts), axis=1) / total * 100
+    return np.where(total > 0, deviation, np.nan)
+
+
+def module_metrics(tables):
+    """
+    The value each limits module is compared with, for every sample at once.
+
+    Args:
+        tables (dict): section title -> list with the SectionTable of each sample,
+            None where a sample lacks the section.
+
+    Returns:
+        dict: limits module -> float64 array (samples,), NaN for samples without the section.
+            sequence_length is 2 for a zero length read, 1 for varying lengths, else 0.
+    """
+    metrics = {}
+    if sections.PER_BASE_SEQ in tables:
+        per_base = tables[sections.PER_BASE_SEQ]
+        metrics["quality_base_lower"] = _reduce(np.nanmin, _stack(per_base, "Lower Quartile"))
+        metrics["quality_base_median"] = _reduce(np.nanmin, _stack(per_base, "Median"))
+    if sections.PER_TILE_SEQ in tables:
+        # tiles more than the limit below the mean of their base
+        metrics["tile"] = -_reduce(np.nanmin, _stack(tables[sections.PER_TILE_SEQ], "Mean"))
+    if sections.PER_SEQ_QUALITY_SCORES in tables:
+        qualities = tables[sections.PER_SEQ_QUALITY_SCORES]
+        quality, counts = _stack(qualities, "#Quality"), _stack(qualities, "Count")
+        # the most frequent mean quality of the reads
+        mode = np.full(len(counts), np.nan)
+        if counts.shape[1]:
+            best = np.argmax(np.nan_to_num(counts, nan=-1.0), axis=1)
+            mode = np.where(np.isnan(counts).all(axis=1), np.nan, quality[np.arange(len(quality)), best])
+        metrics["quality_sequence"] = mode
+    if sections.PER_BASE_SEQ_CONTENT in tables:
+        content = tables[sections.PER_BASE_SEQ_CONTENT]
+        g, a, t, c = (_stack(content, base) for base in "GATC")
+        metrics["sequence"] = _reduce(np.nanmax, np.fmax(np.abs(a - t), np.abs(g - c)))
+    if sections.PER_SEQ_GC_CONTENT in tables:
+        gc_tables = tables[sections.PER_SEQ_GC_CONTENT]
+        metrics["gc_sequence"] = _gc_deviation(_stack(gc_tables, "#GC Content"), _stack(gc_tables, "Count"))
+    if sections.PER_BASE_N_CONTENT in tables:
+        metrics["n_content"] = _reduce(np.nanmax, _stack(tables[sections.PER_BASE_N_CONTENT], "N-Count"))
+    if sections.SEQ_LEN_DIST in tables:
+        metrics["sequence_length"] = np.array([_length_metric(table) for table in tables[sections.SEQ_LEN_DIST]])
+    if sections.SEQ_DUPLICATION_LEVEL in tables:
+        metrics["duplication"] = np.array([
+            float(table.preamble.get("Total Deduplicated Percentage", "nan")) if table is not None else np.nan
+            for table in tables[sections.SEQ_DUPLICATION_LEVEL]])
+    if sections.OVERREPRESENTED_SEQ in tables:
+        overrepresented = tables[sections.OVERREPRESENTED_SEQ]
+        maximum = _reduce(np.nanmax, _stack(overrepresented, "Percentage"))
+        # a section without any sequence passes
+        metrics["overrepresented"] = np.where(
+            [table is not None for table in overrepresented], np.nan_to_num(maximum), np.nan)
+    if sections.ADAPTER_CONTENT in tables:
+        adapters = tables[sections.ADAPTER_CONTENT]
+        names = dict.fromkeys(name for table in adapters if table is not None for name in table.names[1:])
+        stacked = [_reduce(np.nanmax, _stack(adapters, name)) for name in names]
+        metrics["adapter"] = _reduce(np.nanmax, np.stack(stacked, axis=1)) if stacked else np.full(len(adapters), np.nan)
+    if sections.KMER_CONTENT in tables:
+        kmers = tables[sections.KMER_CONTENT]
+        lowest = _reduce(np.nanmin, _stack(kmers, "PValue"))
+        with np.errstate(divide='ignore'):
+            score = -np.log10(np.maximum(lowest, np.finfo(np.float64).tiny))
+        metrics["kmer"] = np.where([table is not None for table in kmers],
+                                   np.where(np.isnan(score), 0.0, score), np.nan)
+    return metrics
+
+
+def _length_metric(table):
+    if table is None or table.is_empty:
+        return np.nan
+    counts = np.asarray(table.column("Count"), dtype=np.float64)
+    starts = np.array([int(str(label).split('-')[0]) for label in table.column(table.names[0])])
+    if np.any((starts == 0) & (counts > 0)):
+        return 2.0
+    return 1.0 if np.count_nonzero(counts > 0) > 1 else 0.0
+
+
+def evaluate(limits, tables):
+    """
+    Recomputes the status of every section with checks, for every sample at once.
+
+    Args:
+        limits (QCLimits): the thresholds.
+        tables (dict): section title -> list with the SectionTable of each sample,
+            None where a sample lacks the section.
+
+    Returns:
+        dict: section title -> array (samples,) of 'pass' / 'warn' / 'fail', '' for
+            samples without the section. Sections whose modules are all ignored are left out.
+    """
+    metrics = module_metrics(tables)
+    statuses = {}
+    for title, checks in CHECKS.items():
+        if title not in tables:
+            continue
+        level = None
+        missing = None
+        for module, high_is_bad in checks:
+            if limits.ignored(module) or module not in metrics:
+                continue
+            values = metrics[module]
+            warn = limits.limits[(module, "warn")]
+            error = limits.limits[(module, "error")]
+            if module == "sequence_length":
+                # FastQC: warn when lengths vary, fail on a zero length read, a 0 limit disables it
+                failed = (values >= 2) & bool(error)
+                warned = (values >= 1) & bool(warn)
+            elif high_is_bad:
+                failed, warned = values > error, values > warn
+            else:
+                failed, warned = values < error, values < warn
+            check_level = np.where(failed, 2, np.where(warned, 1, 0))
+            level = check_level if level is None else np.maximum(level, check_level)
+            missing = np.isnan(values) if missing is None else missing & np.isnan(values)
+        if level is not None:
+            statuses[title] = np.where(missing, "", STATUSES[level])
+    return statuses
@@ -0,0 +1,154 @@
+"""Binary cache of a fully parsed fastqc run, reloaded with memory-mapped arrays"""
+# David Oluwasusi 6th November 2024
+
+import json
+import mmap
+import os
+import shutil
+import numpy as np
+import constants
+from models.section_table import SectionTable
+
+CACHE_VERSION = 1
+META_FILE = "run_cache.json"
+TEXT_FILE = "sections.txt"
+
+
+class RunCache:
+    """
+    Folder holding every parsed section of one fastqc run: a JSON file with the statuses,
+    the Basic Statistics fields and the layout of each table, the section texts in one
+    UTF-8 file, and one .npy file per typed table column.
+    Loading memory maps the column files, so a consumer can read a table such as the
+    per tile one without parsing any text.
+
+    Attributes:
+        path (str): The cache folder.
+        source (dict): path, size and mtime_ns of the fastqc file the cache was made from.
+        fastqc_dict (dict): section title -> {"section_content": str, "status": str,
+            "table": SectionTable or None}, as built by FastQCParser.
+    """
+    def __init__(self, path, source, fastqc_dict):
+        self.path = path
+        self.source = source
+        self.fastqc_dict = fastqc_dict
+
+    @staticmethod
+    def is_cache(path):
+        """True when the path is a run cache folder"""
+        return os.path.isfile(os.path.join(path, META_FILE))
+
+    @property
+    def basic_statistics(self):
+        """The Basic Statistics measures, e.g. {'Total Sequences': '37287903', ...}"""
+        entry = self.fastqc_dict.get(constants.BASIC_STATS)
+        if entry is None or entry.get("table") is None:
+            return {}
+        table = entry["table"]
+        return dict(zip(table.column(table.names[0]), table.column(table.names[1])))
+
+    def save(self):
+        """
+        Writes the cache into a temporary folder and moves it into place,
+        so readers never see a half written cache.
+        """
+        temp_path = self.path.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        stored_sections = {}
+        offset = 0
+        with open(os.path.join(temp_path, TEXT_FILE), 'wb') as text_file:
+            for number, (title, entry) in enumerate(self.fastqc_dict.items()):
+                text = entry["section_content"].encode("utf-8")
+                text_file.write(text)
+                stored = {"status": entry["status"], "text": [offset, offset + len(text)], "table": None}
+                offset += len(text)
+                table = entry.get("table")
+                if table is not None:
+                    files = []
+                    for position, column in enumerate(table.columns):
+                        name = f"{number:02d}_{position}.npy"
+                        np.save(os.path.join(temp_path, name), np.ascontiguousarray(column))
+                        files.append(name)
+                    stored["table"] = {
+                        "rows": len(table),
+                        "names": list(table.names),
+                        "categories": [None if labels is None else list(labels)
+                                       for labels in table.categories],
+                        "preamble": table.preamble,
+                        "files": files,
+                    }
+                stored_sections[title] = stored
+
+        meta = {
+            "version": CACHE_VERSION,
+            "reporter_version": constants.REPORTER_VERSION,
+            "source": self.source,
+            "basic_statistics": self.basic_statistics,
+            "sections": stored_sections,
+        }
+        with open(os.path.join(temp_path, META_FILE), 'w', encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(temp_path, self.path)
+
+    @classmethod
+    def from_file(cls, path, file_path, fastqc_dict):
+        """Creates the cache of a parsed fastqc file, stamped with its size and mtime"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # read from standard input
+            return cls(path, {"path": file_path, "size": None, "mtime_ns": None}, fastqc_dict)
+        source = {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return cls(path, source, fastqc_dict)
+
+    @classmethod
+    def load(cls, path, requested=None):
+        """
+        Loads a cache folder, memory mapping the table columns.
+
+        Args:
+            path (str): the cache folder.
+            requested (Iterable[str], optional): titles of the sections to load, None loads all.
+
+        Raises:
+            ValueError: when the cache was written by an incompatible version.
+        """
+        with open(os.path.join(path, META_FILE), 'r', encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION:
+            raise ValueError(f"unsupported run cache version {meta.get('version')}")
+
+        fastqc_dict = {}
+        with open(os.path.join(path, TEXT_FILE), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            try:
+                for title, stored in meta["sections"].items():
+                    if requested is not None and title not in requested:
+                        continue
+                    start, end = stored["text"]
+                    table = None
+                    if stored["table"] is not None:
+                        table = cls._load_table(path, title, stored["table"])
+                    fastqc_dict[title] = {
+                        "section_content": buffer[start:end].decode("utf-8"),
+                        "status": stored["status"],
+                        "table": table,
+                    }
+            finally:
+                if size:
+                    buffer.close()
+        return cls(path, meta["source"], fastqc_dict)
+
+    @staticmethod
+    def _load_table(path, title, stored):
+        """Rebuilds a SectionTable around the memory mapped column files"""
+        # an empty file cannot be memory mapped, tables without rows are read normally
+        mmap_mode = 'r' if stored["rows"] else None
+        columns = [np.load(os.path.join(path, name), mmap_mode=mmap_mode) for name in stored["files"]]
+        categories = [None if labels is None else tuple(labels) for labels in stored["categories"]]
+        return SectionTable.from_columns(title, stored["names"], columns, categories, stored["preamble"])
@@ -0,0 +1,115 @@
+"""Persistent byte-offset index of the sections in a fastqc file"""
+# David Oluwasusi 6th November 2024
+
+import json
+import os
+
+INDEX_SUFFIX = ".fqidx"
+INDEX_VERSION = 1
+END_MODULE = b">>END_MODULE"
+STATUSES = ("pass", "fail", "warn")
+
+
+class SectionIndex:
+    """
+    Maps each section title of a fastqc file to the byte range of its body and its status.
+    The index is stored as a JSON sidecar next to the fastqc file and is invalidated
+    when the size or modification time of the fastqc file changes.
+
+    Attributes:
+        file_path (str): path of the indexed fastqc file.
+        size (int): size in bytes of the fastqc file when it was indexed.
+        mtime_ns (int): modification time of the fastqc file when it was indexed.
+        sections (dict): section title -> (start, end, status), where start is the
+            offset of the first line after the header and end the offset of its END_MODULE.
+    """
+    def __init__(self, file_path, size, mtime_ns, sections):
+        self.file_path = file_path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.sections = sections
+
+    @staticmethod
+    def index_path(file_path):
+        """Path of the sidecar index for a fastqc file"""
+        return file_path + INDEX_SUFFIX
+
+    @classmethod
+    def build(cls, file_path, buffer):
+        """
+        Scans a fastqc file once for its section headers and END_MODULE lines.
+
+        Args:
+            file_path (str): path of the fastqc file, used for the size/mtime stamp.
+            buffer (bytes | mmap.mmap): the whole content of the fastqc file.
+        """
+        stat = os.stat(file_path)
+        sections = {}
+        current = None
+        pos = 0 if buffer[:2] == b">>" else buffer.find(b"\n>>") + 1
+        while buffer[pos:pos + 2] == b">>":
+            line_end = buffer.find(b"\n", pos)
+            if line_end == -1:
+                line_end = len(buffer)
+            line = buffer[pos:line_end]
+            if current is not None:
+                # Either END_MODULE or a new header closes the current section
+                title, start, status = current
+                sections[title] = (start, pos, status)
+                current = None
+            if not line.startswith(END_MODULE):
+                header = line[2:].decode("utf-8").split()
+                if len(header) >= 2 and header[-1] in STATUSES:
+                    current = (" ".join(header[:-1]), line_end + 1, header[-1])
+            next_header = buffer.find(b"\n>>", line_end)
+            if next_header == -1:
+                break
+            pos = next_header + 1
+        if current is not None:
+            title, start, status = current
+            sections[title] = (min(start, len(buffer)), len(buffer), status)
+        return cls(file_path, stat.st_size, stat.st_mtime_ns, sections)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loads the sidecar index of a fastqc file.
+
+        Returns:
+            SectionIndex | None: the index, or None when it is missing, unreadable or stale.
+        """
+        try:
+            with open(cls.index_path(file_path), 'r', encoding="utf-8") as f:
+                stored = json.load(f)
+            stat = os.stat(file_path)
+        except (OSError, ValueError):
+            return None
+        if (stored.get("version") != INDEX_VERSION
+                or stored.get("size") != stat.st_size
+                or stored.get("mtime_ns") != stat.st_mtime_ns):
+            return None
+        sections = {title: tuple(entry) for title, entry in stored["sections"].items()}
+        return cls(file_path, stored["size"], stored["mtime_ns"], sections)
+
+    def save(self):
+        """Writes the sidecar index, silently skipping read-only input folders"""
+        stored = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "sections": self.sections,
+        }
+        try:
+            with open(self.index_path(self.file_path), 'w', encoding="utf-8") as f:
+                json.dump(stored, f)
+        except OSError:
+            pass
+
+    @classmethod
+    def for_file(cls, file_path, buffer):
+        """Returns the stored index of a fastqc file, rebuilding it when it is stale"""
+        index = cls.load(file_path)
+        if index is None:
+            index = cls.build(file_path, buffer)
+            index.save()
+        return index
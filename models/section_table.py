@@ -0,0 +1,173 @@
+"""Model holding the parsed table of a fastqc section as compact typed columns"""
+# David Oluwasusi 6th November 2024
+
+import numpy as np
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def _typed_column(values):
+    """
+    Converts the tokens of one column to the most compact type that holds them:
+    int32 (int64 when out of range), float64, or int32 categorical codes.
+
+    Returns:
+        tuple: (numpy array, categories tuple or None for numeric columns)
+    """
+    tokens = np.array(values, dtype=str)
+    try:
+        ints = tokens.astype(np.int64)
+        if ints.size == 0 or (ints.min() >= INT32_MIN and ints.max() <= INT32_MAX):
+            return ints.astype(np.int32), None
+        return ints, None
+    except (ValueError, OverflowError):
+        pass
+    try:
+        return np.where(tokens == '', 'nan', tokens).astype(np.float64), None
+    except ValueError:
+        pass
+    # Labels, e.g. '#Duplication Level' or 'Possible Source', keep their first-seen order
+    lookup = {}
+    codes = np.fromiter(
+        (lookup.setdefault(value, len(lookup)) for value in values),
+        dtype=np.int32,
+        count=len(values))
+    return codes, tuple(lookup)
+
+
+class SectionTable:
+    """
+    Tab separated table of a fastqc section, parsed once from the section content
+    at parse time and shared by every consumer of the section, so nothing
+    has to be read back from report.txt.
+    Columns are stored as typed NumPy arrays instead of one string per line.
+
+    Attributes:
+        title (str): The title of the section the table belongs to.
+        preamble (dict): '#Name<TAB>value' lines found before the table header,
+            e.g. {'Total Deduplicated Percentage': '24.004276619603495'}.
+        names (tuple): The column names, as written in the header (including the leading '#').
+        columns (tuple): One NumPy array per column, int32/int64, float64
+            or int32 codes for label columns.
+        categories (tuple): For each column, the labels its codes refer to, or None
+            for numeric columns.
+    """
+    __slots__ = ('title', 'preamble', 'names', 'columns', 'categories')
+
+    def __init__(self, title, text):
+        """
+        Parses the content of a section.
+
+        Args:
+            title (str): The title of the section.
+            text (str | List): The section content, as a string or a list of lines.
+
+        Raises:
+            ValueError: when a row has more fields than the header.
+        """
+        if not isinstance(text, str):
+            text = "".join(text)
+        lines = text.splitlines()
+        # Leading '#' lines: the last one is the header, the others are preamble values
+        header_end = 0
+        while header_end < len(lines) and lines[header_end].startswith('#'):
+            header_end += 1
+        if header_end == 0 and lines:
+            header_end = 1
+        self.title = title
+        self.preamble = {}
+        for line in lines[:max(header_end - 1, 0)]:
+            name, _, value = line[1:].partition('\t')
+            self.preamble[name] = value
+        self.names = tuple(lines[header_end - 1].split('\t')) if header_end else ()
+
+        width = len(self.names)
+        rows = []
+        for number, line in enumerate(lines[header_end:], start=header_end + 1):
+            if not line:
+                continue
+            row = line.split('\t')
+            if len(row) > width:
+                raise ValueError(f"line {number} has {len(row)} fields, expected {width}")
+            if len(row) < width:
+                row.extend([''] * (width - len(row)))
+            rows.append(row)
+
+        columns = []
+        categories = []
+        column_values = zip(*rows) if rows else [()] * width
+        for values in column_values:
+            column, labels = _typed_column(values)
+            columns.append(column)
+            categories.append(labels)
+        self.columns = tuple(columns)
+        self.categories = tuple(categories)
+
+    @classmethod
+    def from_columns(cls, title, names, columns, categories, preamble=None):
+        """
+        Builds a table from already typed columns, e.g. the memory mapped arrays of a RunCache,
+        without parsing any text.
+        """
+        table = cls.__new__(cls)
+        table.title = title
+        table.preamble = dict(preamble or {})
+        table.names = tuple(names)
+        table.columns = tuple(columns)
+        table.categories = tuple(categories)
+        return table
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @property
+    def is_empty(self):
+        """True when the section has no table header"""
+        return not self.names
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns"""
+        return sum(column.nbytes for column in self.columns)
+
+    def column(self, name):
+        """
+        Returns the values of a column, label columns are decoded back to strings.
+
+        Args:
+            name (str): the column name as written in the header.
+        """
+        position = self.names.index(name)
+        labels = self.categories[position]
+        if labels is None:
+            return self.columns[position]
+        return np.array(labels, dtype=object)[self.columns[position]]
+
+    def rows(self):
+        """
+        The table as a list of rows of Python values (int, float or str), label columns
+        decoded and NaN cells given as None, e.g. for JSON output.
+        """
+        columns = []
+        for name, column in zip(self.names, self.columns):
+            values = self.column(name)
+            if column.dtype.kind == 'f':
+                values = np.where(np.isnan(values), None, values.astype(object))
+            columns.append(values.tolist())
+        return [list(row) for row in zip(*columns)]
+
+    @property
+    def frame(self):
+        """The table as a pandas DataFrame, with the dtypes pd.read_csv would give it"""
+        import pandas as pd
+
+        data = {}
+        for name, column, labels in zip(self.names, self.columns, self.categories):
+            if labels is not None:
+                data[name] = np.array(labels, dtype=object)[column]
+            elif column.dtype == np.int32:
+                data[name] = column.astype(np.int64)
+            else:
+                data[name] = column
+        return pd.DataFrame(data, columns=list(self.names))
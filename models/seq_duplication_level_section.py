@@ -5,11 +5,10 @@ It inherits from Section model
 # David Oluwasusi 6th November 2024
 
 import sys
-import os
-import pandas as pd
-import seaborn as sns
+import numpy as np
 import matplotlib.pyplot as plt
 from  models.base_section import Section
+from models.plot_style import set_category_ticks
 
 class SeqDuplicationLevelSection(Section):
     """
@@ -20,7 +19,7 @@ class SeqDuplicationLevelSection(Section):
 
     Attributes:
         title (str): The title of the section.
-        data (List): The primary data content for the section, to be saved in a report file.
+        text (str): The primary data content for the section, to be saved in a report file.
         flag (str): A status or quality flag associated with this section.
         output_folder (str): The path to the root folder for 
             storing report file, flag file and generated plots.
@@ -28,23 +27,32 @@ class SeqDuplicationLevelSection(Section):
     Methods:
         plot_section(): Generates a barplot showing
     the relationship between the percentage of deduplicated sequences and the total sequence
+        draw(ax): Draws the same bar plot with matplotlib only
     """
+    __slots__ = ()
+
+    def draw(self, ax):
+        labels = [str(level) for level in self.table.column('#Duplication Level')]
+        x = np.arange(len(labels))
+        ax.bar(x, self.table.column('Percentage of deduplicated'), color='skyblue', label='Percentage of Deduplicated')
+        ax.bar(x, self.table.column('Percentage of total'), color='salmon', label='Percentage of Total', alpha=0.7)
+        set_category_ticks(ax, labels)
+        ax.set_title('Sequence Duplication Level Distribution')
+        ax.set_xlabel('Duplication Level')
+        ax.set_ylabel('Percentage')
+        ax.legend(title="Legend")
+        ax.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.7)
+
     def plot_section(self):
-        # Load the data from a text file, assuming it's tab-separated
-        file_path = os.path.join(self.output_folder, self.title, 'report.txt')
-        try:
-            data = pd.read_csv(file_path, sep='\t', skiprows=1)
-        except FileNotFoundError:
-            print(f"Error: The file '{file_path}' was not found.")
-            sys.exit(1)
-        except pd.errors.EmptyDataError:
-            print(f"Error: The file '{file_path}' is empty.")
-            sys.exit(1)
-        except pd.errors.ParserError:
-            print(f"Error: The file '{file_path}' could not be parsed. Please check the file format.")
-            sys.exit(1)
+        if self.style.fast:
+            self.plot_fast('sequence_duplication_level_plot.png', (14, 8))
+            return
+        import pandas as pd
+        import seaborn as sns
 
+        data = self.table.frame
         try:
+            # Convert the 'Duplication Level' column to a categorical type to preserve order
             data['#Duplication Level'] = pd.Categorical(
             data['#Duplication Level'],
             categories=data['#Duplication Level'].unique(),
@@ -54,8 +62,7 @@ class SeqDuplicationLevelSection(Section):
             print(f"Error '{kerr}': The column #Duplication Level does not exist.")
             sys.exit(1)
         # end try
-        # Convert the 'Duplication Level' column to a categorical type to preserve order
-       
+
         # Create the plot
         plt.figure(figsize=(14, 8))
         # Plot both "Percentage of deduplicated" and "Percentage of total" as bars
@@ -67,7 +74,7 @@ class SeqDuplicationLevelSection(Section):
             print(f"ValueError while creating plot: {ve}. Please check the data values.")
             sys.exit(1)
         except TypeError as te:
-            print(f"TypeError while creating plot: {te}. Verify data types in the 'report.txt' file.")
+            print(f"TypeError while creating plot: {te}. Verify data types in the section data.")
             sys.exit(1)
         # Add titles and labels
         plt.title('Sequence Duplication Level Distribution')
@@ -77,22 +84,5 @@ class SeqDuplicationLevelSection(Section):
         plt.legend(title="Legend")
         # Enable grid lines for better readability
         plt.grid(True, which='both', linestyle='--', linewidth=0.5, alpha=0.7)
-        # Ensure the output folder exists
-        try:
-            plot_folder = os.path.join(self.output_folder, self.title)
-            os.makedirs(plot_folder, exist_ok=True)
-        # Define the path to save the plot
-            output_path = os.path.join(plot_folder, 'sequence_duplication_level_plot.png')
         # Save the plot
-            plt.savefig(output_path)
-        except PermissionError:
-            print(f"PermissionError: Insufficient permissions to save the plot to '{output_path}'.")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"FileNotFoundError: The path '{output_path}' is invalid. Please verify the output folder structure.")
-            sys.exit(1)
-        except IOError as ioe:
-            print(f"IOError: Could not save the plot to '{output_path}': {ioe}")
-            sys.exit(1)
-        plt.close()  # Close the plot to free memory
-        print(f"Plot saved to {output_path}")
\ No newline at end of file
+        self.save_plot('sequence_duplication_level_plot.png')
@@ -0,0 +1,176 @@
+"""Single-file SQLite output backend holding the sections and plots of many samples"""
+# David Oluwasusi 6th November 2024
+
+import json
+import os
+import re
+import sqlite3
+import constants
+from models.section_table import SectionTable
+
+IMAGE_SUFFIXES = (".png", ".svg", ".pdf")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    input TEXT,
+    reporter_version TEXT,
+    profile TEXT
+);
+CREATE TABLE IF NOT EXISTS sections (
+    sample_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    status TEXT,
+    report TEXT,
+    PRIMARY KEY (sample_id, section)
+);
+CREATE INDEX IF NOT EXISTS idx_sections_section ON sections (section, status);
+CREATE TABLE IF NOT EXISTS basic_statistics (
+    sample_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    measure TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (sample_id, measure)
+);
+CREATE TABLE IF NOT EXISTS plots (
+    sample_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    image BLOB,
+    PRIMARY KEY (sample_id, section, file_name)
+);
+CREATE TABLE IF NOT EXISTS section_tables (
+    section TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL UNIQUE
+);
+"""
+
+
+def table_name(title):
+    """SQL table of a section, e.g. 'Per base N content' -> 'section_per_base_n_content'"""
+    return "section_" + re.sub(r"[^0-9a-z]+", "_", title.lower()).strip("_")
+
+
+def column_name(name):
+    """SQL column of a table column, e.g. '#Base' -> 'base', 'Obs/Exp Max' -> 'obs_exp_max'"""
+    return re.sub(r"[^0-9a-z]+", "_", name.lower()).strip("_") or "value"
+
+
+class SQLiteStore:
+    """
+    SQLite database holding every section of one or many samples, instead of a folder
+    per section: the statuses and report texts, the Basic Statistics measures, one
+    table per tabular section (`section_<title>`, one row per table row, keyed by
+    sample_id and row) and the plots as BLOBs. Every table is indexed by sample, and
+    the `section_tables` table maps section titles to their table names.
+    Writing a sample that is already stored replaces it.
+
+    Attributes:
+        path (str): The database file.
+        connection (sqlite3.Connection): The open connection.
+    """
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('reporter_version', ?)",
+                                (constants.REPORTER_VERSION,))
+        self.connection.commit()
+
+    def close(self):
+        """Closes the database"""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _section_table(self, title, table):
+        """Creates the table of a section, adding the columns earlier samples did not have"""
+        name = table_name(title)
+        self.connection.execute("INSERT OR IGNORE INTO section_tables VALUES (?, ?)", (title, name))
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" ('
+            'sample_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE, '
+            'row INTEGER NOT NULL, PRIMARY KEY (sample_id, row))')
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{name}_sample" ON "{name}" (sample_id)')
+        existing = {row[1] for row in self.connection.execute(f'PRAGMA table_info("{name}")')}
+        columns = []
+        for column, values, labels in zip(table.names, table.columns, table.categories):
+            sql_column = column_name(column)
+            while sql_column in ("sample_id", "row") or sql_column in columns:
+                sql_column += "_"
+            if sql_column not in existing:
+                if labels is not None:
+                    sql_type = "TEXT"
+                elif values.dtype.kind == 'f':
+                    sql_type = "REAL"
+                else:
+                    sql_type = "INTEGER"
+                self.connection.execute(f'ALTER TABLE "{name}" ADD COLUMN "{sql_column}" {sql_type}')
+            columns.append(sql_column)
+        return name, columns
+
+    def add_sample(self, name, input_path, fastqc_dict, files=None, profile=None):
+        """
+        Writes one sample in a single transaction, replacing it when already stored.
+
+        Args:
+            name (str): the sample name.
+            input_path (str): the fastqc file the sample was read from.
+            fastqc_dict (dict): the parsed sections, see FastQCParser.parse_fastqc_to_dictionary.
+            files (dict, optional): (section title, file name) -> bytes of the produced files,
+                the images are stored in the plots table.
+            profile (dict, optional): the --profile results of the sample.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM samples WHERE name = ?", (name,))
+            cursor = self.connection.execute(
+                "INSERT INTO samples (name, input, reporter_version, profile) VALUES (?, ?, ?, ?)",
+                (name, input_path, constants.REPORTER_VERSION,
+                 None if profile is None else json.dumps(profile)))
+            sample_id = cursor.lastrowid
+
+            self.connection.executemany(
+                "INSERT INTO sections VALUES (?, ?, ?, ?)",
+                [(sample_id, title, entry["status"], entry["section_content"])
+                 for title, entry in fastqc_dict.items()])
+
+            for title, entry in fastqc_dict.items():
+                table = entry.get("table")
+                if table is None:
+                    try:
+                        table = SectionTable(title, entry["section_content"])
+                    except ValueError:
+                        # kept as report text only
+                        continue
+                if table.is_empty:
+                    continue
+                if title == constants.BASIC_STATS:
+                    self.connection.executemany(
+                        "INSERT INTO basic_statistics VALUES (?, ?, ?)",
+                        [(sample_id, measure, str(value)) for measure, value in
+                         zip(table.column(table.names[0]), table.column(table.names[1]))])
+                    continue
+                sql_table, columns = self._section_table(title, table)
+                values = [table.column(column).tolist() for column in table.names]
+                placeholders = ", ".join("?" * (len(columns) + 2))
+                quoted = ", ".join(f'"{column}"' for column in columns)
+                self.connection.executemany(
+                    f'INSERT INTO "{sql_table}" (sample_id, row, {quoted}) VALUES ({placeholders})',
+                    ((sample_id, row, *cells) for row, cells in enumerate(zip(*values))))
+
+            self.connection.executemany(
+                "INSERT INTO plots VALUES (?, ?, ?, ?)",
+                [(sample_id, section, file_name, sqlite3.Binary(data))
+                 for (section, file_name), data in (files or {}).items()
+                 if file_name.endswith(IMAGE_SUFFIXES)])
+        print(f"Sample {name} written to {self.path}")
@@ -0,0 +1,267 @@
+"""Server mode: local HTTP service answering section and plot queries from an LRU cache of parsed runs."""
+# David Oluwasusi 6th November 2024
+
+import collections
+import contextlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+import constants as sections
+from batch import assign_output_folders, collect_inputs
+from models import FastQCParser
+from models.fastqc_parser import PLOT_MODELS
+from models.output_writer import MemoryWriter
+from watch import file_stamp
+
+class ServiceError(Exception):
+    """A request that cannot be answered, with the HTTP status to answer with"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """
+    Thread safe least recently used cache bounded by the total size of its values.
+
+    Attributes:
+        max_bytes (int): Total size above which the least recently used entries are evicted.
+        size (int): Total size of the cached values.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that were not.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value, or None, marking it as the most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Caches a value of the given size, evicting the least recently used entries to fit it"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def stats(self):
+        """Entry count, size and hit counts, e.g. for monitoring"""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class RunService:
+    """
+    Answers the queries on the runs of a batch source. Parsed runs and rendered plots
+    are cached, keyed by the size and mtime of the input so a changed file is read again.
+    Parsing and plotting run one at a time (matplotlib and the captured console
+    output are not thread safe), cached answers do not wait for them.
+
+    Attributes:
+        source (str): directory, glob pattern or manifest of the served runs.
+        cache (LRUCache): the parsed runs and rendered plots.
+        use_index (bool): read plain files through their section index.
+        plot_options (dict): section title -> keyword arguments of its plot_section.
+        plot_style (PlotStyle): plotting backend, resolution and PNG compression of the plots.
+    """
+    def __init__(self, source, cache, use_index=True, plot_options=None, plot_style=None):
+        self.source = source
+        self.cache = cache
+        self.use_index = use_index
+        self.plot_options = plot_options or {}
+        self.plot_style = plot_style
+        self._runs = {}
+        self._work_lock = threading.Lock()
+
+    def runs(self, refresh=True):
+        """Run id (the sample name) -> input path of every served run"""
+        if refresh or not self._runs:
+            self._runs = {name: path for name, path, _ in
+                          assign_output_folders(collect_inputs(self.source), "")}
+        return self._runs
+
+    def _run_path(self, run_id):
+        path = self.runs(refresh=False).get(run_id) or self.runs().get(run_id)
+        if path is None:
+            raise ServiceError(404, f"unknown run '{run_id}'")
+        return path
+
+    def _locked(self, work):
+        """Runs parsing/plotting work alone, turning its sys.exit into an error answer"""
+        with self._work_lock:
+            log = io.StringIO()
+            with contextlib.redirect_stdout(log):
+                try:
+                    return work()
+                except SystemExit:
+                    lines = [line for line in log.getvalue().splitlines() if line.strip()]
+                    raise ServiceError(500, lines[-1] if lines else "processing failed") from None
+
+    def parsed(self, run_id):
+        """The parser of a run with every section and table parsed, from the cache when possible"""
+        path = self._run_path(run_id)
+        try:
+            stamp = tuple(file_stamp(path))
+        except OSError:
+            raise ServiceError(404, f"run '{run_id}' is no longer available") from None
+        key = ("run", path, stamp)
+        parser = self.cache.get(key)
+        if parser is None:
+            def parse():
+                parser = FastQCParser(path, "", use_index=self.use_index,
+                                      plot_options=self.plot_options, writer=MemoryWriter(),
+                                      plot_style=self.plot_style)
+                parser.parse_fastqc_to_dictionary()
+                size = 0
+                for title, entry in parser.fastqc_dict.items():
+                    size += len(entry["section_content"])
+                    if title in PLOT_MODELS:
+                        size += parser.section_table(title).nbytes
+                return parser, size
+            parser, size = self._locked(parse)
+            self.cache.put(key, parser, size)
+        return parser, stamp
+
+    def run_summary(self, run_id):
+        """Statuses of the sections of a run"""
+        parser, _ = self.parsed(run_id)
+        return {"run": run_id, "sections": {title: entry["status"] for title, entry in parser.fastqc_dict.items()}}
+
+    def section(self, run_id, title):
+        """The JSON record of one section: title, status, columns, typed rows and preamble"""
+        parser, _ = self.parsed(run_id)
+        entry = parser.fastqc_dict.get(title)
+        if entry is None:
+            raise ServiceError(404, f"run '{run_id}' has no section '{title}'")
+        table = self._locked(lambda: parser.section_table(title))
+        return {
+            "run": run_id,
+            "title": title,
+            "status": entry["status"],
+            "columns": list(table.names),
+            "rows": table.rows(),
+            "preamble": table.preamble,
+        }
+
+    def plot(self, run_id, title):
+        """The PNG of one section, rendered on the first request"""
+        if title not in PLOT_MODELS:
+            raise ServiceError(404, f"section '{title}' has no plot")
+        parser, stamp = self.parsed(run_id)
+        if title not in parser.fastqc_dict:
+            raise ServiceError(404, f"run '{run_id}' has no section '{title}'")
+        key = ("plot", run_id, stamp, title)
+        image = self.cache.get(key)
+        if image is None:
+            def render():
+                section = parser.plot_model(title)
+                parser.writer.files.clear()
+                section.plot_section(**self.plot_options.get(title, {}))
+                return next(iter(parser.writer.files.values()))
+            image = self._locked(render)
+            self.cache.put(key, image, len(image))
+        return image
+
+
+class RunRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        GET /runs                                  run ids
+        GET /runs/<id>                             section statuses of a run
+        GET /runs/<id>/sections/<title>            a section as JSON
+        GET /runs/<id>/sections/<title>/plot.png   the plot of a section
+        GET /stats                                 cache statistics
+    """
+    server_version = "FastQCReporter/" + sections.REPORTER_VERSION
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [unquote(part) for part in urlparse(self.path).path.strip("/").split("/") if part]
+        try:
+            if parts == ["runs"]:
+                self._send_json({"runs": sorted(service.runs())})
+            elif parts == ["stats"]:
+                self._send_json(service.cache.stats())
+            elif len(parts) == 2 and parts[0] == "runs":
+                self._send_json(service.run_summary(parts[1]))
+            elif len(parts) == 4 and parts[0] == "runs" and parts[2] == "sections":
+                self._send_json(service.section(parts[1], parts[3]))
+            elif len(parts) == 5 and parts[0] == "runs" and parts[2] == "sections" and parts[4] == "plot.png":
+                self._send(200, "image/png", service.plot(parts[1], parts[3]))
+            else:
+                raise ServiceError(404, "not found")
+        except ServiceError as e:
+            self._send_json({"error": str(e)}, e.status)
+        except ConnectionError:
+            # the client went away, there is no one to answer
+            pass
+        except Exception as e:
+            self.log_error("error serving %s: %r", self.path, e)
+            self._send_json({"error": f"internal error: {type(e).__name__}: {e}"}, 500)
+
+    def _send_json(self, payload, status=200):
+        self._send(status, "application/json", json.dumps(payload, allow_nan=False).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def run_server(source, host="127.0.0.1", port=8000, cache_mb=256, use_index=True, plot_options=None,
+               quiet=False, plot_style=None):
+    """
+    Serves the runs of a batch source over HTTP until interrupted.
+
+    Args:
+        source (str): directory, glob pattern or manifest of fastqc files (see batch.collect_inputs).
+        host (str): address to listen on, local only by default.
+        port (int): port to listen on.
+        cache_mb (float): size of the cache of parsed runs and rendered plots, in MB.
+        use_index (bool): read plain files through their section index.
+        plot_options (dict): section title -> keyword arguments of its plot_section.
+        quiet (bool): do not log every request.
+        plot_style (PlotStyle): plotting backend, resolution and PNG compression of the plots.
+    """
+    # the service renders in threads of this process, without a display
+    import matplotlib
+    matplotlib.use("Agg")
+
+    server = ThreadingHTTPServer((host, port), RunRequestHandler)
+    server.service = RunService(source, LRUCache(int(cache_mb * 1024 * 1024)), use_index, plot_options,
+                                plot_style)
+    server.quiet = quiet
+    print(f"Serving {source} on http://{host}:{server.server_address[1]}/runs")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping the server")
+    finally:
+        server.server_close()
@@ -0,0 +1,33 @@
+"""Tests of the contaminant matcher"""
+# David Oluwasusi 6th November 2024
+
+from models.contaminant_matcher import ContaminantMatcher, reverse_complement
+
+# FastQC's adapter_list.txt, 12 bp entries separated from their names by tabs
+ADAPTER_LIST = """# Adapters searched for by FastQC
+Illumina Universal Adapter\t\t\t\t\tAGATCGGAAGAG
+Illumina Small RNA 3' Adapter\t\t\t\tTGGAATTCTCGG
+Nextera Transposase Sequence\t\t\t\tCTGTCTCTTATA
+"""
+
+
+def test_short_adapter_list_entries_match(tmp_path):
+    path = tmp_path / "adapter_list.txt"
+    path.write_text(ADAPTER_LIST, encoding="utf-8")
+    matcher = ContaminantMatcher.from_file(str(path))
+
+    hit = matcher.match("GATTACAGATTACA" + "AGATCGGAAGAG" + "CACGTCTGAACTCCAGTCAC")
+    assert hit.name == "Illumina Universal Adapter"
+    assert (hit.strand, hit.identity, hit.overlap) == ("+", 100.0, 12)
+
+    hit = matcher.match(reverse_complement("CTGTCTCTTATA") + "GGGGCCCCAAAATTTT")
+    assert (hit.name, hit.strand, hit.overlap) == ("Nextera Transposase Sequence", "-", 12)
+
+
+def test_partial_overlap_of_a_short_entry_is_not_a_hit(tmp_path):
+    path = tmp_path / "adapter_list.txt"
+    path.write_text(ADAPTER_LIST, encoding="utf-8")
+    matcher = ContaminantMatcher.from_file(str(path))
+
+    # the read ends 6 bases into the adapter
+    assert matcher.match("CCCCCCCCCCCCCCCCCCCCAGATCG") is None
@@ -0,0 +1,31 @@
+"""Tests of the stage profiler"""
+# David Oluwasusi 6th November 2024
+
+import pytest
+from models.profiler import StageProfiler
+
+
+def record(stage, wall, cpu):
+    return {"stage": stage, "section": "Kmer Content", "wall_s": wall, "cpu_s": cpu, "peak_bytes": None}
+
+
+def test_summary_adds_up_repeated_stages():
+    profiler = StageProfiler()
+    profiler.extend([record("encode", 0.3, 0.2), record("encode", 0.5, 0.4), record("plot", 2.0, 1.5)])
+
+    stages = profiler.summary()["Kmer Content"]
+
+    assert stages["encode"]["wall_s"] == pytest.approx(0.8)
+    assert stages["encode"]["cpu_s"] == pytest.approx(0.6)
+    assert stages["encode"]["count"] == 2
+    assert stages["figure"]["wall_s"] == pytest.approx(1.2)
+    assert stages["figure"]["cpu_s"] == pytest.approx(0.9)
+
+
+def test_stage_records_each_run():
+    profiler = StageProfiler()
+    for _ in range(2):
+        with profiler.stage("encode", "Kmer Content"):
+            pass
+
+    assert profiler.summary()["Kmer Content"]["encode"]["count"] == 2
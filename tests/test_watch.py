@@ -0,0 +1,28 @@
+"""Tests of the watch mode"""
+# David Oluwasusi 6th November 2024
+
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_watch_once_stores_samples_in_sqlite(tmp_path):
+    for number, name in enumerate(("a", "b"), start=1):
+        os.makedirs(tmp_path / "in" / name)
+        shutil.copy(os.path.join(REPO, "data", f"fastqc_data{number}.txt"), tmp_path / "in" / name / "fastqc_data.txt")
+    database = tmp_path / "out" / "qc.db"
+
+    subprocess.run([sys.executable, os.path.join(REPO, "fastqc_reporter.py"), str(tmp_path / "in"), str(database),
+                    "--watch", "--once", "--sqlite", "--no-plots", "-q", "-w", "1"],
+                   check=True, cwd=tmp_path, stdout=subprocess.DEVNULL)
+
+    with sqlite3.connect(database) as connection:
+        samples = sorted(name for name, in connection.execute("SELECT name FROM samples"))
+        sections = connection.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+    assert samples == ["a", "b"]
+    assert sections > 0
+    assert os.path.isfile(tmp_path / "out" / ".fastqc_reporter_watch.json")
@@ -0,0 +1,205 @@
+"""Watch mode: polls a folder and reports new or changed fastqc files with a warm worker pool."""
+# David Oluwasusi 6th November 2024
+
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from batch import collect_inputs, process_sample, sample_name
+
+STATE_FILE = ".fastqc_reporter_watch.json"
+STATE_VERSION = 1
+
+
+def _init_warm_worker():
+    """Loads the plotting libraries once per worker process, before the first sample arrives"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import pandas  # noqa: F401
+    import seaborn  # noqa: F401
+
+
+def _worker_ready(_):
+    """No-op task used to start the workers and run their initializer up front"""
+    return os.getpid()
+
+
+def file_stamp(path):
+    """Size and modification time of a file, the state of a processed file is compared on them"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class WatchState:
+    """
+    Files already processed by the watch mode, kept in a small JSON file so a restart
+    does not redo them. A file is processed again when its size or mtime changes.
+
+    Attributes:
+        path (str): The state file.
+        files (dict): input path -> {"stamp": [size, mtime_ns], "sample": str, "status": str}
+    """
+    def __init__(self, path, files=None):
+        self.path = path
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path):
+        """Loads the state file, an empty state when missing, unreadable or from another version"""
+        try:
+            with open(path, 'r', encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if stored.get("version") != STATE_VERSION:
+            return cls(path)
+        return cls(path, stored.get("files", {}))
+
+    def is_done(self, input_path, stamp):
+        """True when the file was processed with this size and mtime"""
+        entry = self.files.get(input_path)
+        return entry is not None and entry["stamp"] == stamp
+
+    def sample_for(self, input_path):
+        """The sample name of a file, kept across restarts and unique among the watched files"""
+        entry = self.files.get(input_path)
+        if entry is not None:
+            return entry["sample"]
+        taken = {entry["sample"] for entry in self.files.values()}
+        name = base = sample_name(input_path)
+        number = 1
+        while name in taken:
+            number += 1
+            name = f"{base}_{number}"
+        # reserved now so files found in the same scan get distinct names
+        self.files[input_path] = {"stamp": None, "sample": name, "status": "pending"}
+        return name
+
+    def record(self, input_path, stamp, result):
+        """Records the outcome of a processed file"""
+        self.files[input_path] = {"stamp": stamp, "sample": result["sample"], "status": result["status"]}
+
+    def save(self):
+        """Writes the state through a temporary file so a crash never leaves it half written"""
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "files": self.files}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+
+def scan(source, state, last_seen, settle=True):
+    """
+    Lists the files of the watched source that have to be processed.
+
+    Args:
+        source (str): the watched directory, glob or manifest (see batch.collect_inputs).
+        state (WatchState): the processed files.
+        last_seen (dict): input path -> stamp at the previous scan, updated in place.
+        settle (bool): only return files whose size and mtime did not change since the
+            previous scan, so files still being written are left for a later scan.
+
+    Returns:
+        List[tuple]: (input path, stamp) of the files to process.
+    """
+    ready = []
+    for path in collect_inputs(source):
+        try:
+            stamp = file_stamp(path)
+        except OSError:
+            continue
+        if state.is_done(path, stamp):
+            continue
+        previous = last_seen.get(path)
+        last_seen[path] = stamp
+        if settle and previous != stamp:
+            continue
+        ready.append((path, stamp))
+    return ready
+
+
+def run_watch(args, source, output_folder, workers=None, interval=5.0, once=False):
+    """
+    Polls the source and reports every new or changed fastqc file into its own
+    subfolder of the output folder, over a pool of worker processes that keep the
+    plotting libraries loaded between samples. Runs until interrupted (Ctrl+C or SIGTERM).
+
+    Args:
+        args (argparse.Namespace): the parsed command line options, applied to every file.
+        source (str): the watched directory, glob or manifest.
+        output_folder (str): root folder of the per sample output folders and the state file,
+            or the database file with --sqlite, the state file is then written next to it.
+        workers (int, optional): number of worker processes, defaults to the CPU count.
+        interval (float): seconds between two scans.
+        once (bool): process what is there now, without waiting for files to settle, and return.
+
+    Returns:
+        List[dict]: the summary rows of the files processed.
+    """
+    store = None
+    state_folder = output_folder
+    if args.sqlite:
+        from models.sqlite_store import SQLiteStore
+        store = SQLiteStore(output_folder)
+        state_folder = os.path.dirname(os.path.abspath(output_folder))
+    state = WatchState.load(os.path.join(state_folder, STATE_FILE))
+    last_seen = {}
+    running = {}
+    results = []
+
+    def stop(signum, frame):
+        sys.exit(0)
+
+    previous_handler = signal.signal(signal.SIGTERM, stop)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_warm_worker)
+    try:
+        # start every worker now, so the first sample does not pay for the imports
+        list(executor.map(_worker_ready, range(workers or os.cpu_count() or 1)))
+        print(f"Watching {source} every {interval:g}s")
+        while True:
+            in_flight = {path for path, _ in running.values()}
+            for path, stamp in scan(source, state, last_seen, settle=not once):
+                if path in in_flight:
+                    continue
+                name = state.sample_for(path)
+                out = output_folder if store is not None else os.path.join(output_folder, name)
+                future = executor.submit(process_sample, args, name, path, out)
+                running[future] = (path, stamp)
+            if once and not running:
+                break
+            if running:
+                done, _ = wait(running, timeout=None if once else interval, return_when=FIRST_COMPLETED)
+            else:
+                done = ()
+                time.sleep(interval)
+            for future in done:
+                path, stamp = running.pop(future)
+                result = future.result()
+                print(result.pop("log"), end="")
+                record = result.pop("record", None)
+                if record is not None:
+                    # stored before the state, so a crash redoes the sample instead of losing it
+                    store.add_sample(**record)
+                # the batch-wide tables are not built by the watch mode
+                for key in ("kmers", "overrepresented", "adapters"):
+                    result.pop(key, None)
+                print(f"{result['sample']}: {result['status']} {result['error']}".rstrip())
+                state.record(path, stamp, result)
+                state.save()
+                results.append(result)
+    except KeyboardInterrupt:
+        print("Stopping the watch")
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        executor.shutdown(wait=True, cancel_futures=True)
+        if store is not None:
+            store.close()
+        # names reserved for files that were never processed are dropped
+        state.files = {path: entry for path, entry in state.files.items() if entry["stamp"] is not None}
+        state.save()
+    return results